@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+import database
+from mix import Mix, run_plan_async
+from metrics import Metrics
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("MAIN.ASYNC")
+
+
+class AsyncRunner(object):
+    """
+    Keep many mix operations in flight on one event loop with an AsyncEngine
+    :params mix file, concurrent operations, duration in seconds or passes over the mix per task
+    :return stats dict
+    """
+
+    def __init__(self, mix, concurrency=100, duration=None, iterations=1, seed=None, metrics=None, uri=None):
+        self.mix = Mix.load(mix, seed) if isinstance(mix, str) else mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.iterations = iterations
+        self.metrics = metrics or Metrics()
+        self.uri = uri
+        self.stats = {"operations": 0, "errors": 0, "rows": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def engine_options(self):
+        # every task may hold a connection, sqlite connects per checkout
+        if database.async_uri(self.uri).get_backend_name() == "sqlite":
+            return {}
+        return {"pool_size": self.concurrency, "max_overflow": 0}
+
+    async def task(self, engine, deadline):
+        """ One in flight operation at a time, a fresh session per operation """
+        remaining = self.iterations * len(self.mix.operations)
+        while True:
+            if self.mix.due():
+                async with engine.connect() as conn:
+                    await conn.run_sync(self.mix.refresh)
+            name = self.mix.choose()
+            plan = self.mix.plan(name)
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            start = time.perf_counter()
+            error = False
+            try:
+                async with AsyncSession(engine) as session:
+                    rows = await run_plan_async(session, plan, self.metrics, name)
+                # add after the await, other tasks update the totals meanwhile
+                self.stats["rows"] += rows or 0
+            except SQLAlchemyError as db_err:
+                error = True
+                self.stats["errors"] += 1
+                logger.warning("Operation {} failed: {}".format(name, str(db_err)))
+            finally:
+                self.stats["in_flight"] -= 1
+            self.metrics.record(name, time.perf_counter() - start, error)
+            self.stats["operations"] += 1
+
+            remaining -= 1
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    break
+            elif remaining <= 0:
+                break
+
+    async def main(self):
+        engine = database.make_async_engine(self.uri, **self.engine_options())
+        try:
+            async with engine.connect() as conn:
+                await conn.run_sync(self.mix.refresh)
+            start = time.perf_counter()
+            deadline = start + self.duration if self.duration is not None else None
+            await asyncio.gather(*[self.task(engine, deadline) for _ in range(self.concurrency)])
+            self.stats["seconds"] = time.perf_counter() - start
+        finally:
+            await engine.dispose()
+        return self.stats
+
+    def run(self):
+        return asyncio.run(self.main())
+
+
+def report(stats):
+    """ Return the async runner summary line """
+    seconds = stats["seconds"] or 1.0
+    return ["{} operations, {} errors, {} rows in {:.3f}s ({:.1f} ops/sec, {} in flight at most)".format(
+        str(stats["operations"]), str(stats["errors"]), str(stats["rows"]), stats["seconds"],
+        stats["operations"] / seconds, str(stats["max_in_flight"]))]
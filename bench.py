@@ -0,0 +1,251 @@
+import os
+import gc
+import sys
+import json
+import shutil
+import contextlib
+import logging
+import argparse
+import platform
+import tempfile
+import config
+
+logger = logging.getLogger("BENCH")
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+SCALE_FACTOR = 0.05
+SEED = 42
+REPEAT = 10
+# timed rounds of the seedings and of the operations, the load throughput compared is their median
+ROUNDS = 5
+# benchmarks timed fewer times than this are reported but not compared
+MIN_SAMPLES = 5
+# the median is compared from MIN_SAMPLES, a tail percentile of few samples is about their max,
+# reported but compared only from these many samples
+P90_SAMPLES = 200
+P99_SAMPLES = 1000
+# latency changes smaller than this, in milliseconds, are timer and scheduler noise
+NOISE_FLOOR_MS = 1.0
+THRESHOLD = 0.25
+
+
+def run_benchmarks(path, scale_factor=SCALE_FACTOR, seed=SEED, repeat=REPEAT, mix=None, rounds=ROUNDS):
+    """
+    Time the tasks.get_* loaders on the local fixtures, seed a SQLite database at a fixed scale and seed,
+    then time each workload operation, over several rounds
+    :params database file, scale factor, seed, runs per operation and round, optional mix file, rounds
+    :return results dict of benchmark name to throughput, the p50, p90 and p99 of the pooled samples and
+            their number
+    """
+    # the engine is created on import, so configure the database first
+    config.Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+    config.Config.SQLALCHEMY_ECHO = False
+    import random
+    import statistics
+    import database
+    import main
+    from metrics import Metrics, Histogram, registry
+    from tasks import load_stats, reset_load_stats
+
+    # the reads log every row, keep that out of the timings
+    logging.getLogger("MAIN").setLevel(logging.WARNING)
+    logging.getLogger("TASKS").setLevel(logging.WARNING)
+    database.configure_engine()
+    rounds = max(rounds, 1)
+    throughputs = {}
+    histograms = {}
+
+    def collect(name, histogram, throughput=None):
+        if throughput is not None:
+            throughputs.setdefault(name, []).append(throughput)
+        histograms.setdefault(name, Histogram()).merge(histogram)
+
+    def seed_rounds(prefix, runner):
+        for _ in range(rounds):
+            database.drop_db()
+            random.seed(seed)
+            reset_load_stats()
+            registry.reset()
+            runner.init_db()
+            with paused_gc():
+                runner.populate_data()
+            for table_name, stats in load_stats.items():
+                if stats["rows"]:
+                    collect(prefix + table_name, registry.histograms.get("load." + table_name, Histogram()),
+                            stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0)
+
+    # the loaders of the seed data sources, on the fixtures shipped with the repo
+    seed_rounds("loader.", main.Workload(source="local", metrics=Metrics()))
+    runner = main.Workload(scale_factor=scale_factor, seed=seed, metrics=Metrics(), mix=mix)
+    seed_rounds("load.", runner)
+
+    for _ in range(rounds):
+        runner.metrics.reset()
+        with paused_gc():
+            for name in runner.operations():
+                for _ in range(repeat):
+                    runner.run_operation(name)
+        for name, histogram in runner.metrics.histograms.items():
+            collect(name, histogram)
+    runner.db.close()
+
+    results = {}
+    for name, histogram in histograms.items():
+        p50 = histogram.percentile(50)
+        # a load's rows/sec per seeding, an operation's rate from its median time, not its outlier prone mean
+        if name in throughputs:
+            throughput = statistics.median(throughputs[name])
+        else:
+            throughput = 1.0 / p50 if p50 else 0.0
+        results[name] = {"throughput": throughput, "samples": histogram.count}
+        for p in (50, 90, 99):
+            results[name]["p{}".format(p)] = histogram.percentile(p)
+    return results
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """ Collect, then keep the cyclic garbage collector out of the timings, as timeit does """
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def compare(baseline, results, threshold=THRESHOLD, min_samples=MIN_SAMPLES, p90_samples=P90_SAMPLES,
+            p99_samples=P99_SAMPLES, noise_floor=NOISE_FLOOR_MS):
+    """
+    Diff the results against a baseline, the throughput and the median of the pooled samples, their p90 and p99
+    only with enough samples on both sides, latency changes under the noise floor are ignored
+    :params baseline and current results, the tolerated relative change, samples needed to compare at all, to
+            compare the p90 and to compare the p99, noise floor in milliseconds
+    :return report lines, list of regressions
+    """
+    percentiles = (("p50", min_samples), ("p90", p90_samples), ("p99", p99_samples))
+    lines = ["{:<36} {:>8} {:>12} {:>8} {:>10} {:>8} {:>8} {:>8}".format(
+        "benchmark", "samples", "ops/s", "delta", "p50", "delta", "p90", "p99")]
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        current = results.get(name)
+        if current is None:
+            regressions.append("{}: missing from the results".format(name))
+            continue
+        throughput = change(current["throughput"], base["throughput"])
+        deltas = {label: change(current.get(label, 0.0), base.get(label, 0.0)) for label, _ in percentiles}
+        flag = ""
+        samples = min(base.get("samples", 0), current.get("samples", 0))
+        if samples < min_samples:
+            flag = "  skipped"
+        else:
+            failed = []
+            if throughput < -threshold:
+                failed.append("throughput {:+.1f}%".format(throughput * 100))
+            for label, needed in percentiles:
+                grown = (current.get(label, 0.0) - base.get(label, 0.0)) * 1000
+                if samples >= needed and deltas[label] > threshold and grown > noise_floor:
+                    failed.append("{} {:+.1f}% ({:+.3f}ms)".format(label, deltas[label] * 100, grown))
+            if failed:
+                regressions.append("{}: {}".format(name, ", ".join(failed)))
+                flag = "  REGRESSION"
+        lines.append("{:<36} {:>8} {:>12.1f} {:>+7.1f}% {:>10.3f} {:>+7.1f}% {:>+7.1f}% {:>+7.1f}%{}".format(
+            name, str(samples), current["throughput"], throughput * 100, current.get("p50", 0.0) * 1000,
+            deltas["p50"] * 100, deltas["p90"] * 100, deltas["p99"] * 100, flag))
+    return lines, regressions
+
+
+def change(value, base):
+    return (value - base) / base if base else 0.0
+
+
+def environment():
+    import sqlite3
+    import sqlalchemy
+    return {
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the loaders and workload operations on SQLite")
+    parser.add_argument("--record", type=str, help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", type=str, help="Compare the results against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Relative throughput drop or latency increase that fails the comparison, i.e. 0.25")
+    parser.add_argument("--scale-factor", type=float, default=SCALE_FACTOR, help="Generated data scale factor")
+    parser.add_argument("--seed", type=int, default=SEED, help="Random seed of the generated data")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Runs of each workload operation")
+    parser.add_argument("--rounds", type=int, default=ROUNDS,
+                        help="Timed rounds of the seeding and the operations, their medians are compared")
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES,
+                        help="Timed samples a benchmark needs on both sides to be compared")
+    parser.add_argument("--p90-samples", type=int, default=P90_SAMPLES,
+                        help="Timed samples a benchmark needs on both sides for its p90 to be compared")
+    parser.add_argument("--p99-samples", type=int, default=P99_SAMPLES,
+                        help="Timed samples a benchmark needs on both sides for its p99 to be compared")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR_MS,
+                        help="Latency increase in milliseconds below which percentile changes are ignored")
+    parser.add_argument("--mix", type=str, help="Benchmark the operations of a mix file instead of the reads")
+    parser.add_argument("--database", type=str,
+                        help="SQLite database file, a fresh temporary file by default")
+    args = parser.parse_args()
+
+    settings = {"scale_factor": args.scale_factor, "seed": args.seed, "repeat": args.repeat, "mix": args.mix,
+                "rounds": args.rounds}
+    if args.compare:
+        # the baseline's settings, so both runs measure the same thing
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        settings = baseline["settings"]
+
+    directory = None
+    if args.database:
+        path = args.database
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        directory = tempfile.mkdtemp(prefix="sequel-bench-")
+        path = os.path.join(directory, "bench.sqlite3")
+    try:
+        logger.info("Benchmarking at scale factor {} with seed {}".format(
+            str(settings["scale_factor"]), str(settings["seed"])))
+        results = run_benchmarks(path, **settings)
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump({"settings": settings, "environment": environment(), "results": results}, f, indent=2)
+        logger.info("Baseline written to: {}".format(args.record))
+
+    if args.compare:
+        if any("samples" not in result for result in baseline["results"].values()):
+            logger.warning("The baseline has no sample counts, its benchmarks are skipped, record it again")
+        if baseline["environment"] != environment():
+            logger.warning("Baseline recorded on {}, running on {}".format(baseline["environment"], environment()))
+        lines, regressions = compare(baseline["results"], results, args.threshold, args.min_samples,
+                                       args.p90_samples, args.p99_samples, args.noise_floor)
+        for line in lines:
+            logger.info(line)
+        if regressions:
+            for regression in regressions:
+                logger.error("Regression: {}".format(regression))
+            sys.exit(1)
+        logger.info("No regressions beyond {:.0f}%".format(args.threshold * 100))
+
+    if not args.record and not args.compare:
+        for name, result in sorted(results.items()):
+            logger.info("{:<36} {:>12.1f} ops/s {:>10.3f} ms p50 {:>10.3f} ms p90 {:>10.3f} ms p99".format(
+                name, result["throughput"], result["p50"] * 1000, result["p90"] * 1000, result["p99"] * 1000))
@@ -6,10 +6,25 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 class Config(object):
     DEBUG = True
     QUERY_LIMIT = 15000
+    BATCH_SIZE = 1000
+    LOAD_RETRIES = 5
+    YIELD_PER = 1000
+    DATA_SOURCE = "mockaroo"
+    DATA_DIR = os.path.join(BASE_DIR, "data")
     SECRET_KEY = os.urandom(64)
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + BASE_DIR + "/db.sqlite3"
+    SQLALCHEMY_ECHO = True
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+    POOL_CLASS = None
+    POOL_SIZE = None
+    POOL_MAX_OVERFLOW = None
+    POOL_TIMEOUT = None
+    POOL_RECYCLE = None
+    POOL_PRE_PING = False
+    SQLITE_PRAGMAS = None
+    COORDINATOR_URL = "localhost:6000"
+    COORDINATOR_AUTHKEY = b"sequel"
     APP_NAME = "SEQUEL: DB Workload Runner"
     API_KEY = "?key="
     BASE_URL = "https://my.api.mockaroo.com/"
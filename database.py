@@ -1,9 +1,68 @@
+import pools
+import idpool
+import pragmas
 from config import Config
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, convert_unicode=True, echo=True)
+
+def make_engine(uri=None, monitor=None, **kwargs):
+    """
+    Create an engine with the application defaults and pool settings, i.e. one per worker
+    :params database uri, a pools.PoolMonitor to instrument the pool, create_engine overrides
+    :return engine
+    """
+    uri = uri or Config.SQLALCHEMY_DATABASE_URI
+    options = pools.pool_options(Config)
+    options.update(kwargs)
+    if monitor is not None:
+        url = make_url(uri)
+        base = options.get("poolclass") or url.get_dialect().get_pool_class(url)
+        options["poolclass"] = pools.timed_pool_class(base, monitor)
+    engine = create_engine(uri, convert_unicode=True, echo=Config.SQLALCHEMY_ECHO, **options)
+    if monitor is not None:
+        monitor.attach(engine)
+    if Config.SQLITE_PRAGMAS and engine.dialect.name == "sqlite":
+        pragmas.attach(engine, Config.SQLITE_PRAGMAS)
+    return engine
+
+
+# asyncio drivers by backend, aiosqlite locally and aiomysql in production
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_uri(uri=None):
+    """ Swap the database uri's driver for its asyncio counterpart """
+    url = make_url(uri or Config.SQLALCHEMY_DATABASE_URI)
+    if url.drivername in ASYNC_DRIVERS.values():
+        return url
+    try:
+        return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    except KeyError:
+        raise ValueError("No asyncio driver for: {}".format(url.get_backend_name()))
+
+
+def make_async_engine(uri=None, **kwargs):
+    """ Create an AsyncEngine on the asyncio driver of the database uri """
+    engine = create_async_engine(async_uri(uri), echo=Config.SQLALCHEMY_ECHO, **kwargs)
+    if Config.SQLITE_PRAGMAS and engine.dialect.name == "sqlite":
+        pragmas.attach(engine.sync_engine, Config.SQLITE_PRAGMAS)
+    return engine
+
+
+def make_session(bind):
+    """ Create a standalone session bound to an engine """
+    return sessionmaker(autocommit=False, autoflush=False, bind=bind)()
+
+
+engine = make_engine()
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
                                          bind=engine))
@@ -11,9 +70,25 @@ Base = declarative_base()
 session = db_session()
 
 
+def configure_engine(monitor=None):
+    """ Rebuild the module engine from the current Config, i.e. after command line overrides """
+    global engine
+    engine.dispose()
+    engine = make_engine(monitor=monitor)
+    db_session.remove()
+    db_session.configure(bind=engine)
+
+
 def init_db():
     # import all modules here that might define models so that
     # they will be registered properly on the metadata.  Otherwise
     # you will have to import them first before calling init_db()
     import models
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+
+def drop_db():
+    import models
+    db_session.remove()
+    Base.metadata.drop_all(bind=engine)
+    idpool.registry.clear()
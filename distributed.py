@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import socket
+import logging
+import multiprocessing
+import config
+import logpipe
+import workers
+import scheduler
+import profiler
+import distributions
+from metrics import Metrics
+from multiprocessing.connection import Listener, Client
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger("MAIN.DISTRIBUTED")
+cfg = config.Config()
+
+# seconds between the start barrier being released and the agents starting together
+START_DELAY = 2.0
+
+
+def parse_address(text):
+    """ Parse host:port, the host defaults to localhost """
+    host, _, port = text.rpartition(":")
+    return host or "localhost", int(port)
+
+
+class SocketBroker(object):
+    """
+    Coordinator and agents talking over a socket, local or across hosts
+    :params host:port url, Config.COORDINATOR_URL by default
+    :return connections with send and recv
+    """
+
+    def __init__(self, url=None):
+        self.address = parse_address(url or cfg.COORDINATOR_URL)
+        self.authkey = cfg.COORDINATOR_AUTHKEY
+        self.listener = None
+
+    def listen(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+
+    def accept(self):
+        return self.listener.accept()
+
+    def connect(self, timeout=30.0):
+        # agents may come up before the coordinator is listening
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except ConnectionRefusedError:
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+
+class RedisChannel(object):
+    """ One agent's pair of redis lists, messages are JSON """
+
+    def __init__(self, client, inbox, outbox):
+        self.client = client
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def send(self, message):
+        self.client.rpush(self.outbox, json.dumps(message))
+
+    def recv(self):
+        _, data = self.client.blpop(self.inbox)
+        return json.loads(data)
+
+    def close(self):
+        self.client.delete(self.inbox)
+
+
+class RedisBroker(object):
+    """
+    Coordinator and agents exchanging messages through redis lists, i.e. the Celery broker
+    :params redis url, Config.CELERY_BROKER_URL by default
+    :return channels with send and recv
+    """
+    prefix = "sequel:"
+
+    def __init__(self, url=None):
+        if redis is None:
+            raise ValueError("The redis broker requires the redis package")
+        self.client = redis.Redis.from_url(url or cfg.CELERY_BROKER_URL)
+
+    def listen(self):
+        pass
+
+    def accept(self):
+        _, agent = self.client.blpop(self.prefix + "hello")
+        agent = agent.decode()
+        return RedisChannel(self.client, self.prefix + agent + ":up", self.prefix + agent + ":down")
+
+    def connect(self):
+        agent = str(self.client.incr(self.prefix + "agents"))
+        channel = RedisChannel(self.client, self.prefix + agent + ":down", self.prefix + agent + ":up")
+        self.client.rpush(self.prefix + "hello", agent)
+        return channel
+
+    def close(self):
+        pass
+
+
+BROKERS = {
+    "socket": SocketBroker,
+    "redis": RedisBroker,
+}
+
+
+def get_broker(name="socket", url=None):
+    try:
+        return BROKERS[name](url)
+    except KeyError:
+        raise ValueError("Unknown broker: {}".format(name))
+
+
+def expect(message, kind):
+    """ Check the type of a message, agents report their failures in place of a result """
+    if message.get("error"):
+        raise RuntimeError("Agent {} failed: {}".format(message.get("agent"), message["error"]))
+    if message.get("type") != kind:
+        raise RuntimeError("Expected a {} message, got {}".format(kind, message.get("type")))
+    return message
+
+
+def make_slices(plan, agents):
+    """
+    Split a run between the agents
+    :params run plan dict, number of agents
+    :return one slice per agent, open loop rates divided and seeds offset past the other agents' workers
+    """
+    slices = []
+    for i in range(agents):
+        task = dict(plan, agent=i, agents=agents)
+        if plan.get("seed") is not None:
+            task["seed"] = plan["seed"] + i * (plan["workers"] + 1)
+        if plan.get("stages"):
+            task["stages"] = [(qps / agents, seconds) for qps, seconds in plan["stages"]]
+        slices.append(task)
+    return slices
+
+
+def run_slice(workload_class, task):
+    """ Run one agent's slice of the workload, returns its stats and metrics """
+    if task.get("stages"):
+        schedule = scheduler.OpenLoopScheduler(workload_class, task["stages"], task["arrival"],
+                                               workers=task["workers"], seed=task["seed"],
+                                               options=task["options"])
+        stats = schedule.run()
+        metrics = Metrics().merge(schedule.metrics).merge(schedule.service, prefix="service.")
+        return {"stats": stats, "wall": stats["seconds"], "metrics": metrics.to_dict()}
+
+    stats, wall = workers.run_workers(workload_class, task["workers"], task["backend"],
+                                      duration=task["duration"], iterations=task["iterations"],
+                                      options=task["options"], seed=task["seed"])
+    metrics = workers.merge_metrics(stats)
+    for s in stats:
+        # merged above, only the counts travel back
+        s.pop("metrics", None)
+        s.pop("statements", None)
+        s.pop("row_log", None)
+        s.pop("keys_touched", None)
+    return {"stats": stats, "wall": wall, "metrics": metrics.to_dict()}
+
+
+def run_agent(workload_class, broker):
+    """
+    Connect to the coordinator, wait for a slice and the start barrier, run it and send back the results
+    :params workload_class, broker
+    :return None
+    """
+    channel = broker.connect()
+    host = socket.gethostname()
+    try:
+        channel.send({"type": "hello", "host": host, "pid": os.getpid()})
+        task = expect(channel.recv(), "slice")["slice"]
+        config.Config.SQLALCHEMY_DATABASE_URI = task["uri"]
+        config.Config.SQLALCHEMY_ECHO = task["echo"]
+        for name, value in task["pool"].items():
+            setattr(config.Config, name, value)
+        if task["profile"]:
+            profiler.registry.reset()
+            profiler.registry.enable()
+        logpipe.registry.reset()
+        distributions.registry.reset()
+        channel.send({"type": "ready", "agent": task["agent"]})
+
+        start_at = expect(channel.recv(), "start")["start_at"]
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        logger.info("Agent {} starting".format(str(task["agent"])))
+
+        try:
+            result = run_slice(workload_class, task)
+            result["statements"] = profiler.registry.to_dict()
+            result["row_log"] = logpipe.registry.to_dict()
+            result["keys_touched"] = distributions.registry.to_dict()
+        except Exception as e:
+            result = {"error": str(e)}
+        channel.send(dict(result, type="result", agent=task["agent"], host=host))
+    finally:
+        channel.close()
+
+
+def agent_main(workload_class, broker_name, url):
+    run_agent(workload_class, get_broker(broker_name, url))
+
+
+def spawn_agents(workload_class, agents, broker_name="socket", url=None):
+    """ Start agents as local processes, for running the distributed mode on one box """
+    processes = []
+    for _ in range(agents):
+        # not daemonic, agents may run process workers of their own
+        process = multiprocessing.Process(target=agent_main, args=(workload_class, broker_name, url))
+        process.start()
+        processes.append(process)
+    return processes
+
+
+class Coordinator(object):
+    """
+    Hand out workload slices to the agents, release them together and collect their results
+    :params number of agents, broker
+    :return list of agent results
+    """
+
+    def __init__(self, agents, broker):
+        self.agents = agents
+        self.broker = broker
+
+    def run(self, plan):
+        channels = []
+        self.broker.listen()
+        try:
+            while len(channels) < self.agents:
+                channel = self.broker.accept()
+                hello = expect(channel.recv(), "hello")
+                logger.info("Agent {} connected from {} (pid {})".format(
+                    str(len(channels)), hello["host"], str(hello["pid"])))
+                channels.append(channel)
+
+            for channel, task in zip(channels, make_slices(plan, self.agents)):
+                channel.send({"type": "slice", "slice": task})
+            for channel in channels:
+                expect(channel.recv(), "ready")
+
+            # the start barrier, every agent is ready
+            start_at = time.time() + START_DELAY
+            for channel in channels:
+                channel.send({"type": "start", "start_at": start_at})
+            return [expect(channel.recv(), "result") for channel in channels]
+        finally:
+            for channel in channels:
+                channel.close()
+            self.broker.close()
+
+
+def merge_results(results):
+    """ Merge the agent histograms and counters, their profiled statements, per row log counts and keys touched """
+    merged = Metrics()
+    for result in results:
+        merged.merge(Metrics.from_dict(result["metrics"]))
+        profiler.registry.merge(result.get("statements", {}))
+        logpipe.registry.merge(result.get("row_log", []))
+        distributions.registry.merge(result.get("keys_touched", {}))
+    return merged
+
+
+def report(results):
+    """ Return the aggregate and per agent throughput report lines """
+    lines = []
+    operations = errors = 0
+    wall = max(result["wall"] for result in results) if results else 0.0
+    for result in results:
+        stats = result["stats"]
+        if isinstance(stats, dict):
+            done, failed = stats["completed"], stats["errors"] + stats["failed"]
+        else:
+            done, failed = sum(s["operations"] for s in stats), sum(s["errors"] for s in stats)
+        operations += done
+        errors += failed
+        lines.append("Agent {} ({}): {} operations, {} errors in {:.3f}s ({:.1f} ops/sec)".format(
+            str(result["agent"]), result["host"], str(done), str(failed), result["wall"],
+            done / result["wall"] if result["wall"] else 0.0))
+    lines.insert(0, "{} agents: {} operations, {} errors in {:.3f}s ({:.1f} ops/sec)".format(
+        str(len(results)), str(operations), str(errors), wall, operations / wall if wall else 0.0))
+    return lines
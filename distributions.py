@@ -0,0 +1,215 @@
+import json
+import math
+import threading
+from collections import Counter
+
+# the tables a bare distribution applies to, others stay uniform unless named
+KEYED_TABLES = ("dealer", "customer", "customer_order")
+
+
+class Uniform(object):
+    """ Every key equally likely """
+
+    def index(self, rng, n):
+        return rng.randrange(n)
+
+    def __str__(self):
+        return "uniform"
+
+
+class Zipf(object):
+    """
+    Key i (1 based, lowest ids first) drawn with probability proportional to 1 / i^exponent,
+    sampled in O(1) by rejection-inversion (Hormann and Derflinger), so the key count can grow
+    :params exponent
+    """
+
+    def __init__(self, exponent=1.0):
+        if exponent <= 0:
+            raise ValueError("The Zipf exponent must be positive: {}".format(exponent))
+        self.exponent = exponent
+        self.h_integral_x1 = self.h_integral(1.5) - 1.0
+        self.s = 2.0 - self.h_integral_inverse(self.h_integral(2.5) - self.h(2.0))
+
+    def index(self, rng, n):
+        h_integral_n = self.h_integral(n + 0.5)
+        while True:
+            u = h_integral_n + rng.random() * (self.h_integral_x1 - h_integral_n)
+            x = self.h_integral_inverse(u)
+            k = min(max(int(x + 0.5), 1), n)
+            if k - x <= self.s or u >= self.h_integral(k + 0.5) - self.h(k):
+                return k - 1
+
+    def h(self, x):
+        return math.exp(-self.exponent * math.log(x))
+
+    def h_integral(self, x):
+        log_x = math.log(x)
+        return helper2((1.0 - self.exponent) * log_x) * log_x
+
+    def h_integral_inverse(self, x):
+        t = max(x * (1.0 - self.exponent), -1.0)
+        return math.exp(helper1(t) * x)
+
+    def __str__(self):
+        return "zipf:{:g}".format(self.exponent)
+
+
+def helper1(x):
+    """ log(1 + x) / x, accurate near zero """
+    return math.log1p(x) / x if abs(x) > 1e-8 else 1.0 - x / 2.0
+
+
+def helper2(x):
+    """ (exp(x) - 1) / x, accurate near zero """
+    return math.expm1(x) / x if abs(x) > 1e-8 else 1.0 + x / 2.0
+
+
+class Hotspot(object):
+    """
+    A share of the keys, the lowest ids, getting a share of the traffic, uniform within each set
+    :params fraction of the keys that are hot, fraction of the picks going to them
+    """
+
+    def __init__(self, keys=0.2, traffic=0.8):
+        if not 0.0 < keys < 1.0 or not 0.0 <= traffic <= 1.0:
+            raise ValueError("Hotspot fractions out of range: {} {}".format(keys, traffic))
+        self.keys = keys
+        self.traffic = traffic
+
+    def index(self, rng, n):
+        hot = min(max(int(n * self.keys), 1), n)
+        if hot == n or rng.random() < self.traffic:
+            return rng.randrange(hot)
+        return hot + rng.randrange(n - hot)
+
+    def __str__(self):
+        return "hotspot:{:g}:{:g}".format(self.keys, self.traffic)
+
+
+class Latest(Zipf):
+    """ Zipf over recency, the most recently inserted keys (highest ids) are the hottest """
+
+    def index(self, rng, n):
+        return n - 1 - Zipf.index(self, rng, n)
+
+    def __str__(self):
+        return "latest:{:g}".format(self.exponent)
+
+
+DISTRIBUTIONS = {
+    "uniform": Uniform,
+    "zipf": Zipf,
+    "hotspot": Hotspot,
+    "latest": Latest,
+}
+
+
+def parse(spec):
+    """
+    Build a distribution from its spec
+    :params name and colon separated arguments, i.e. uniform, zipf:1.1, hotspot:0.1:0.9 or latest:1.0
+    :return distribution
+    """
+    name, *args = spec.split(":")
+    try:
+        return DISTRIBUTIONS[name](*[float(a) for a in args])
+    except KeyError:
+        raise ValueError("Unknown key distribution: {}".format(name))
+    except TypeError:
+        raise ValueError("Bad key distribution arguments: {}".format(spec))
+
+
+class KeyChooser(object):
+    """
+    Pick keys by table with the configured distributions and count the keys actually picked
+    :params None
+    :return None
+    """
+
+    def __init__(self):
+        self.distributions = {}
+        self.touched = {}
+        self.lock = threading.Lock()
+        self.uniform = Uniform()
+
+    def configure(self, specs):
+        """ Set the distributions from a dict of table name to spec, the "default" entry covers KEYED_TABLES """
+        specs = dict(specs or {})
+        default = specs.pop("default", None)
+        distributions = {name: parse(default) for name in KEYED_TABLES} if default else {}
+        distributions.update({name: parse(spec) for name, spec in specs.items()})
+        self.distributions = distributions
+
+    def distribution(self, table_name):
+        return self.distributions.get(table_name, self.uniform)
+
+    def skewed(self, table_name):
+        return table_name in self.distributions and not isinstance(self.distributions[table_name], Uniform)
+
+    def index(self, table_name, rng, n):
+        """ The index of a key among n, drawn from the table's distribution """
+        return self.distribution(table_name).index(rng, n)
+
+    def pick(self, table_name, rng, low, n):
+        """ A key of the dense range low..low + n - 1, counted as touched """
+        key = low + self.index(table_name, rng, n)
+        self.touch(table_name, key)
+        return key
+
+    def touch(self, table_name, key):
+        with self.lock:
+            touched = self.touched.get(table_name)
+            if touched is None:
+                touched = self.touched[table_name] = Counter()
+            touched[key] += 1
+
+    def reset(self):
+        with self.lock:
+            self.touched = {}
+
+    def to_dict(self):
+        """ The keys touched per table, to hand back from a worker process or agent """
+        with self.lock:
+            return {name: {str(key): count for key, count in counter.items()} for name, counter in self.touched.items()}
+
+    def merge(self, touched):
+        """ Add the keys touched handed back by worker processes or agents """
+        with self.lock:
+            for name, counts in touched.items():
+                counter = self.touched.get(name)
+                if counter is None:
+                    counter = self.touched[name] = Counter()
+                counter.update({int(key): count for key, count in counts.items()})
+
+    def export(self, path):
+        """ Write the histogram of keys touched, per table key to pick count, as JSON """
+        with self.lock:
+            touched = {name: {str(key): count for key, count in sorted(counter.items())}
+                       for name, counter in self.touched.items()}
+        with open(path, "w") as f:
+            json.dump({"distributions": {name: str(d) for name, d in self.distributions.items()},
+                       "touched": touched}, f, indent=2)
+
+    def report(self, top=5):
+        """ Return the keys touched per table, their spread and the hottest keys, as report lines """
+        with self.lock:
+            touched = {name: Counter(counter) for name, counter in self.touched.items()}
+        lines = ["{:<16} {:<16} {:>9} {:>9} {:>8} {:>8} {:>8}  {}".format(
+            "table", "distribution", "picks", "keys", "top 1%", "top 10%", "top 20%", "hottest keys")]
+        for name, counter in sorted(touched.items()):
+            picks = sum(counter.values())
+            counts = sorted(counter.values(), reverse=True)
+            shares = []
+            for fraction in (0.01, 0.1, 0.2):
+                hot = max(int(len(counts) * fraction), 1)
+                shares.append(sum(counts[:hot]) / picks * 100.0)
+            hottest = ", ".join("{}:{}".format(key, count) for key, count in counter.most_common(top))
+            lines.append("{:<16} {:<16} {:>9} {:>9} {:>7.1f}% {:>7.1f}% {:>7.1f}%  {}".format(
+                name, str(self.distribution(name)), str(picks), str(len(counts)), shares[0], shares[1], shares[2],
+                hottest))
+        return lines
+
+
+# the process wide chooser, shared by the loaders, the generator and the mix key ranges
+registry = KeyChooser()
@@ -0,0 +1,167 @@
+import csv
+import time
+import logging
+import threading
+import metrics
+from metrics import Metrics, PERCENTILES
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger("MAIN.EXPORTER")
+
+CSV_FIELDS = ("time", "metric", "kind", "count", "errors", "rate", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+
+
+def label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+class LiveExporter(object):
+    """
+    Expose the run's metrics while it runs, a Prometheus /metrics endpoint and a per second CSV time series
+    :params http port, csv path, sampling interval in seconds
+    :return None
+    """
+
+    def __init__(self, port=None, csv_path=None, interval=1.0):
+        self.port = port
+        self.csv_path = csv_path
+        self.interval = interval
+        self.live = None
+        self.previous = None
+        self.sampled_at = None
+        self.rates = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.server = None
+        self.sampler = None
+        self.csv_file = None
+        self.writer = None
+
+    def start(self):
+        # every registry created from now on records into the live one as well
+        self.live = Metrics()
+        self.live.tap = None
+        metrics.live = self.live
+        metrics.registry.tap = self.live
+        self.previous = Metrics()
+        self.sampled_at = time.time()
+
+        if self.csv_path:
+            self.csv_file = open(self.csv_path, "w", newline="")
+            self.writer = csv.writer(self.csv_file)
+            self.writer.writerow(CSV_FIELDS)
+        self.sampler = threading.Thread(target=self.sample_loop, name="metrics-sampler", daemon=True)
+        self.sampler.start()
+
+        if self.port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = exporter.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer(("", self.port), Handler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Serving metrics on http://localhost:{}/metrics".format(str(self.port)))
+
+    def stop(self):
+        self.stopping.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+        metrics.registry.tap = None
+        metrics.live = None
+
+    def sample_loop(self):
+        while not self.stopping.wait(self.interval):
+            self.sample()
+        # the last partial interval
+        self.sample()
+
+    def sample(self):
+        """ Compute the rates and percentiles of the last interval, and write them to the CSV """
+        current = Metrics.from_dict(self.live.to_dict())
+        now = time.time()
+        elapsed = max(now - self.sampled_at, 1e-6)
+        rates = {}
+        rows = []
+        for name, histogram in sorted(current.histograms.items()):
+            window = histogram.window(self.previous.histograms.get(name))
+            rates[name] = window.count / elapsed
+            if window.count:
+                rows.append((round(now, 3), name, "latency", window.count, window.errors, round(rates[name], 1),
+                             round(window.percentile(50.0) * 1000, 3), round(window.percentile(90.0) * 1000, 3),
+                             round(window.percentile(99.0) * 1000, 3), round(window.max / 1000.0, 3)))
+        for name, count in sorted(current.counters.items()):
+            delta = count - self.previous.counters.get(name, 0)
+            if delta:
+                rows.append((round(now, 3), name, "counter", delta, 0, round(delta / elapsed, 1), "", "", "", ""))
+        for name, gauge in sorted(current.gauges.items()):
+            rows.append((round(now, 3), name, "gauge", gauge["value"], 0, "", "", "", "", ""))
+
+        with self.lock:
+            self.rates = rates
+        self.previous = current
+        self.sampled_at = now
+        if self.writer is not None:
+            self.writer.writerows(rows)
+            self.csv_file.flush()
+
+    def render(self):
+        """ The live metrics in the Prometheus text exposition format """
+        current = Metrics.from_dict(self.live.to_dict())
+        with self.lock:
+            rates = dict(self.rates)
+        lines = [
+            "# HELP sequel_operation_latency_seconds Operation latency since the start of the run",
+            "# TYPE sequel_operation_latency_seconds summary",
+        ]
+        for name, histogram in sorted(current.histograms.items()):
+            for p in PERCENTILES:
+                lines.append('sequel_operation_latency_seconds{{operation="{}",quantile="{:g}"}} {}'.format(
+                    label(name), p / 100.0, histogram.percentile(p)))
+            lines.append('sequel_operation_latency_seconds_sum{{operation="{}"}} {}'.format(
+                label(name), histogram.total / 1000000.0))
+            lines.append('sequel_operation_latency_seconds_count{{operation="{}"}} {}'.format(
+                label(name), histogram.count))
+
+        lines += ["# HELP sequel_operation_errors_total Failed operations",
+                  "# TYPE sequel_operation_errors_total counter"]
+        for name, histogram in sorted(current.histograms.items()):
+            lines.append('sequel_operation_errors_total{{operation="{}"}} {}'.format(label(name), histogram.errors))
+
+        lines += ["# HELP sequel_operation_rate Operations per second over the last sampling interval",
+                  "# TYPE sequel_operation_rate gauge"]
+        for name, rate in sorted(rates.items()):
+            lines.append('sequel_operation_rate{{operation="{}"}} {}'.format(label(name), rate))
+
+        lines += ["# HELP sequel_events_total Counted events, i.e. rollbacks, deadlocks and pool churn",
+                  "# TYPE sequel_events_total counter"]
+        for name, count in sorted(current.counters.items()):
+            lines.append('sequel_events_total{{name="{}"}} {}'.format(label(name), count))
+
+        lines += ["# HELP sequel_gauge Gauges, i.e. pool connections in use",
+                  "# TYPE sequel_gauge gauge"]
+        for name, gauge in sorted(current.gauges.items()):
+            lines.append('sequel_gauge{{name="{}"}} {}'.format(label(name), gauge["value"]))
+        lines += ["# HELP sequel_gauge_max The highest value of each gauge",
+                  "# TYPE sequel_gauge_max gauge"]
+        for name, gauge in sorted(current.gauges.items()):
+            lines.append('sequel_gauge_max{{name="{}"}} {}'.format(label(name), gauge["max"]))
+        return "\n".join(lines) + "\n"
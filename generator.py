@@ -0,0 +1,273 @@
+import random
+import logging
+import config
+import populate
+import distributions
+from array import array
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from database import db_session as db
+from models import Dealer, Customer, Address, Location, ProductType, Product, CustomerOrder, \
+    OrderDetail, OrderShipping
+from tasks import bulk_insert
+
+logger = logging.getLogger("TASKS.GENERATOR")
+cfg = config.Config()
+
+# rows per table at scale factor 1, child tables are expressed per parent row
+CARDINALITY = {
+    "dealers": 10,
+    "locations_per_dealer": 3,
+    "product_types_per_dealer": 10,
+    "products": 1000,
+    "customers": 10000,
+    "orders_per_customer": 10,
+    "details_per_order": 3,
+}
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+               "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas"]
+STREETS = ["Main Street", "Oak Avenue", "Pine Road", "Maple Drive", "Cedar Lane", "Elm Court",
+           "Lake Way", "Hill Trail", "Park Plaza", "Sunset Circle"]
+CITIES = [("Orlando", "FL", "32801"), ("Austin", "TX", "73301"), ("Denver", "CO", "80202"),
+          ("Seattle", "WA", "98101"), ("Boston", "MA", "02108"), ("Phoenix", "AZ", "85001"),
+          ("Atlanta", "GA", "30301"), ("Chicago", "IL", "60601")]
+CARRIERS = ["FedEx", "UPS", "DHL", "USPS"]
+SHIPPING_STATUS = ["Awaiting Shipment", "Shipped", "In Transit", "Delivered"]
+
+
+def plan(scale_factor):
+    """ Return the row count per table for a scale factor """
+    dealers = max(1, int(CARDINALITY["dealers"] * scale_factor))
+    customers = max(1, int(CARDINALITY["customers"] * scale_factor))
+    orders = customers * CARDINALITY["orders_per_customer"]
+    return {
+        "dealer": dealers,
+        "location": dealers * CARDINALITY["locations_per_dealer"],
+        "product_type": dealers * CARDINALITY["product_types_per_dealer"],
+        "product": max(1, int(CARDINALITY["products"] * scale_factor)),
+        "customer": customers,
+        "address": customers,
+        "customer_order": orders,
+        "order_detail": orders * CARDINALITY["details_per_order"],
+        "order_shipping": orders,
+    }
+
+
+def max_id(model):
+    """ The highest primary key in a table, generated ids are offset from it """
+    return db.query(func.max(model.id)).scalar() or 0
+
+
+def batches(count, batch_size):
+    """ Yield (start, size) windows covering count rows """
+    for start in range(0, count, batch_size):
+        yield start, min(batch_size, count - start)
+
+
+def rows_from_columns(columns):
+    """ Turn a dict of equal length column lists into executemany row mappings """
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*(columns[k] for k in keys))]
+
+
+def generate_table(model, count, batch_size, make_columns):
+    """ Insert count generated rows, building each batch column by column """
+    def rows():
+        for start, size in batches(count, batch_size):
+            for row in rows_from_columns(make_columns(start, size)):
+                yield row
+    return bulk_insert(model, rows(), batch_size)
+
+
+def generate(scale_factor=1.0, seed=None, batch_size=None, workers=1):
+    """
+    Populate every table at a scale factor with referential integrity, reproducible from a seed
+    :params scale factor, seed, rows per batch, tables loaded at once
+    :return dict of table name to its rows loaded, start and seconds
+    """
+    keys = distributions.registry
+    batch_size = batch_size or cfg.BATCH_SIZE
+    counts = plan(scale_factor)
+    # a random stream per table, so the data is the same whichever order the tables load in
+    rngs = {name: random.Random(None if seed is None else "{}:{}".format(seed, name)) for name in counts}
+    now = datetime.now().replace(microsecond=0)
+    logger.info("Generating scale factor {}: {}".format(str(scale_factor), counts))
+
+    # ids are assigned explicitly so child rows can reference parents arithmetically
+    dealer_base = max_id(Dealer)
+    location_base = max_id(Location)
+    type_base = max_id(ProductType)
+    product_base = max_id(Product)
+    customer_base = max_id(Customer)
+    address_base = max_id(Address)
+    order_base = max_id(CustomerOrder)
+    detail_base = max_id(OrderDetail)
+    shipping_base = max_id(OrderShipping)
+
+    n_dealers = counts["dealer"]
+    n_types = counts["product_type"]
+    n_products = counts["product"]
+    n_customers = counts["customer"]
+    orders_per_customer = CARDINALITY["orders_per_customer"]
+    details_per_order = CARDINALITY["details_per_order"]
+
+    def dealer_columns(start, size):
+        ids = range(dealer_base + start + 1, dealer_base + start + size + 1)
+        return {
+            "id": ids,
+            "name": ["Dealer {}".format(i) for i in ids],
+            "dealer_code": ["DLR{:08d}".format(i) for i in ids],
+        }
+
+    def location_columns(start, size):
+        rng = rngs["location"]
+        ids = range(location_base + start + 1, location_base + start + size + 1)
+        return {
+            "id": ids,
+            "dealer_id": [dealer_base + 1 + i // CARDINALITY["locations_per_dealer"]
+                          for i in range(start, start + size)],
+            "address": ["{} {}".format(n, s) for n, s in zip(
+                [rng.randint(1, 99999) for _ in range(size)], rng.choices(STREETS, k=size))],
+            "active": [True] * size,
+        }
+
+    def type_columns(start, size):
+        ids = range(type_base + start + 1, type_base + start + size + 1)
+        return {
+            "id": ids,
+            "dealer_id": [dealer_base + 1 + i // CARDINALITY["product_types_per_dealer"]
+                          for i in range(start, start + size)],
+            "name": ["Product Type {}".format(i) for i in ids],
+            "active": [True] * size,
+        }
+
+    # product prices are kept to price the order lines
+    prices = array("d")
+
+    def product_columns(start, size):
+        rng = rngs["product"]
+        ids = range(product_base + start + 1, product_base + start + size + 1)
+        type_idx = [rng.randrange(n_types) for _ in range(size)]
+        price = [round(rng.uniform(1.0, 1000.0), 2) for _ in range(size)]
+        prices.extend(price)
+        return {
+            "id": ids,
+            "dealer_id": [dealer_base + 1 + t // CARDINALITY["product_types_per_dealer"] for t in type_idx],
+            "product_type_id": [type_base + 1 + t for t in type_idx],
+            "name": ["Product {}".format(i) for i in ids],
+            "description": ["Generated product {}".format(i) for i in ids],
+            "item_price": price,
+            "active": [True] * size,
+            "location_id": [None] * size,
+        }
+
+    # the dealer of each customer is kept so orders reference the same dealer
+    customer_dealers = array("l")
+
+    def customer_columns(start, size):
+        rng = rngs["customer"]
+        ids = range(customer_base + start + 1, customer_base + start + size + 1)
+        dealer_ids = [keys.pick("dealer", rng, dealer_base + 1, n_dealers) for _ in range(size)]
+        customer_dealers.extend(dealer_ids)
+        first = rng.choices(FIRST_NAMES, k=size)
+        last = rng.choices(LAST_NAMES, k=size)
+        return {
+            "id": ids,
+            "dealer_id": dealer_ids,
+            "first_name": first,
+            "last_name": last,
+            "email": ["{}.{}{}@example.com".format(f.lower(), l.lower(), i) for f, l, i in zip(first, last, ids)],
+            "phone": ["{:03d}-{:03d}-{:04d}".format(rng.randint(200, 999), rng.randint(200, 999),
+                                                     rng.randint(0, 9999)) for _ in range(size)],
+            "status": [True] * size,
+        }
+
+    def address_columns(start, size):
+        rng = rngs["address"]
+        city = rng.choices(CITIES, k=size)
+        return {
+            "id": range(address_base + start + 1, address_base + start + size + 1),
+            "customer_id": range(customer_base + start + 1, customer_base + start + size + 1),
+            "street": ["{} {}".format(n, s) for n, s in zip(
+                [rng.randint(1, 99999) for _ in range(size)], rng.choices(STREETS, k=size))],
+            "city": [c[0] for c in city],
+            "state": [c[1] for c in city],
+            "zip_code": [c[2] for c in city],
+            "latitude": [round(rng.uniform(25.0, 48.0), 4) for _ in range(size)],
+            "longitude": [round(rng.uniform(-123.0, -71.0), 4) for _ in range(size)],
+            "status": [True] * size,
+        }
+
+    # the customer of each order, kept so the shipping goes to the customer's address
+    order_customers = array("l")
+
+    def order_columns(start, size):
+        rng = rngs["customer_order"]
+        if keys.skewed("customer"):
+            customer_idx = [keys.pick("customer", rng, customer_base + 1, n_customers) - customer_base - 1
+                            for _ in range(size)]
+        else:
+            customer_idx = [i // orders_per_customer for i in range(start, start + size)]
+        order_customers.extend(customer_idx)
+        customer_ids = [customer_base + 1 + c for c in customer_idx]
+        return {
+            "id": range(order_base + start + 1, order_base + start + size + 1),
+            "dealer_id": [customer_dealers[c] for c in customer_idx],
+            "customer_id": customer_ids,
+            "order_number": ["{}-{}".format(c, rng.randint(2000000, 3000000)) for c in customer_ids],
+            "order_date": [now - timedelta(seconds=rng.randrange(365 * 86400)) for _ in range(size)],
+            "order_status": [rng.random() < 0.9 for _ in range(size)],
+        }
+
+    def detail_columns(start, size):
+        rng = rngs["order_detail"]
+        product_idx = [rng.randrange(n_products) for _ in range(size)]
+        quantity = [rng.randint(1, 10) for _ in range(size)]
+        price = [prices[p] for p in product_idx]
+        return {
+            "id": range(detail_base + start + 1, detail_base + start + size + 1),
+            "order_id": [order_base + 1 + i // details_per_order for i in range(start, start + size)],
+            "order_product_id": [product_base + 1 + p for p in product_idx],
+            "order_product_quantity": quantity,
+            "order_product_item_price": price,
+            "order_line_item_total": [round(q * p, 2) for q, p in zip(quantity, price)],
+        }
+
+    def shipping_columns(start, size):
+        rng = rngs["order_shipping"]
+        order_idx = range(start, start + size)
+        status = rng.choices(SHIPPING_STATUS, k=size)
+        return {
+            "id": range(shipping_base + start + 1, shipping_base + start + size + 1),
+            "address_id": [address_base + 1 + order_customers[o] for o in order_idx],
+            "order_id": [order_base + 1 + o for o in order_idx],
+            "order_detail_id": [detail_base + 1 + o * details_per_order for o in order_idx],
+            "shipping_date": [now - timedelta(days=rng.randrange(365)) for _ in range(size)],
+            "shipping_status": status,
+            "shipping_tracking_number": ["{:040x}".format(rng.getrandbits(160)) for _ in range(size)],
+            "shipping_carrier": rng.choices(CARRIERS, k=size),
+            "shipping_delivered": [s == "Delivered" for s in status],
+            "shipping_final_disposition": ["DELIVERED" if s == "Delivered" else "NOT DELIVERED" for s in status],
+        }
+
+    tables = {
+        "dealer": lambda: generate_table(Dealer, n_dealers, batch_size, dealer_columns),
+        "location": lambda: generate_table(Location, counts["location"], batch_size, location_columns),
+        "product_type": lambda: generate_table(ProductType, n_types, batch_size, type_columns),
+        "product": lambda: generate_table(Product, n_products, batch_size, product_columns),
+        "customer": lambda: generate_table(Customer, n_customers, batch_size, customer_columns),
+        "address": lambda: generate_table(Address, counts["address"], batch_size, address_columns),
+        "customer_order": lambda: generate_table(CustomerOrder, counts["customer_order"], batch_size, order_columns),
+        "order_detail": lambda: generate_table(OrderDetail, counts["order_detail"], batch_size, detail_columns),
+        "order_shipping": lambda: generate_table(OrderShipping, counts["order_shipping"], batch_size,
+                                                 shipping_columns),
+    }
+    # the kept prices, customer dealers and order customers are written before any table reading them
+    # starts, the readers reference the tables writing them
+    timings = populate.run_graph(tables, workers)
+    total = sum(timing["result"] for timing in timings.values())
+    logger.info("{} Total Generated Records".format(str(total)))
+    return timings
@@ -0,0 +1,122 @@
+import random
+import threading
+from array import array
+import distributions
+from sqlalchemy import select, func
+
+
+class IdPool(object):
+    """
+    The primary keys of a table as a compact typed array, or just its bounds while the ids are dense
+    :params primary key column, integer columns kept alongside each id (i.e. foreign keys), most ids held
+    :return None
+    """
+
+    def __init__(self, column, *paired, limit=None):
+        self.column = column
+        self.paired = paired
+        self.limit = limit
+        self.low = 0
+        self.high = 0
+        self.count = 0
+        # materialized on the first gap in the ids, until then low..high is the pool
+        self.ids = None
+        self.values = [array("l") for _ in paired]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """ The ids and their paired column values, in id order """
+        for i in range(self.count):
+            yield (self.id_at(i),) + tuple(values[i] for values in self.values)
+
+    def clear(self):
+        self.low = self.high = self.count = 0
+        self.ids = None
+        self.values = [array("l") for _ in self.paired]
+
+    def refresh(self, session):
+        """ Fetch the ids inserted since the last refresh, only the new rows and only the key columns """
+        with self.lock:
+            newest = session.execute(select(func.max(self.column))).scalar() or 0
+            if newest < self.high:
+                # rows were removed, i.e. the schema was dropped and seeded again
+                self.clear()
+            if newest == self.high or (self.limit is not None and self.count >= self.limit):
+                return 0
+            statement = select(self.column, *self.paired).where(self.column > self.high).order_by(self.column)
+            if self.limit is not None:
+                statement = statement.limit(self.limit - self.count)
+            added = 0
+            for row in session.execute(statement):
+                self.add(row[0])
+                for values, value in zip(self.values, row[1:]):
+                    values.append(value)
+                added += 1
+            return added
+
+    def add(self, id):
+        if self.ids is None:
+            if not self.count:
+                self.low = id
+            elif id != self.high + 1:
+                self.ids = array("l", range(self.low, self.high + 1))
+        if self.ids is not None:
+            self.ids.append(id)
+        self.high = id
+        self.count += 1
+
+    def id_at(self, index):
+        return self.low + index if self.ids is None else self.ids[index]
+
+    def pick(self, rng=random):
+        """ A random id in O(1) from the table's key distribution, None when the table is empty """
+        if not self.count:
+            return None
+        return self.id_at(self.pick_index(rng))
+
+    def pick_row(self, rng=random):
+        """ A random id with its paired column values """
+        if not self.count:
+            return None
+        index = self.pick_index(rng)
+        return (self.id_at(index),) + tuple(values[index] for values in self.values)
+
+    def pick_index(self, rng):
+        table_name = self.column.table.name
+        index = distributions.registry.index(table_name, rng, self.count)
+        distributions.registry.touch(table_name, self.id_at(index))
+        return index
+
+
+class IdPools(object):
+    """ The id pools shared by the loaders, one per table and paired columns """
+
+    def __init__(self):
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def get(self, session, model, *paired, limit=None):
+        """
+        The id pool of a model, refreshed with the rows inserted since it was last used
+        :params session, model, names of the columns kept alongside each id, most ids held
+        :return IdPool
+        """
+        table = model.__table__
+        key = (table.name,) + paired + (limit,)
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = self.pools[key] = IdPool(table.c.id, *[table.c[name] for name in paired], limit=limit)
+        pool.refresh(session)
+        return pool
+
+    def clear(self):
+        with self.lock:
+            self.pools = {}
+
+
+# the process wide pools, cleared when the schema is dropped
+registry = IdPools()
@@ -0,0 +1,130 @@
+import logging
+from database import Base
+from sqlalchemy import Index, inspect
+
+logger = logging.getLogger("MAIN.INDEXES")
+
+# indexes managed by the profiles share this prefix, others are left alone
+PREFIX = "ix_profile_"
+
+# composite indexes covering the workload's lookups, joins and sorts
+COVERING = (
+    ("customer", ("dealer_id", "last_name", "first_name")),
+    ("customer_order", ("customer_id", "order_date")),
+    ("customer_order", ("dealer_id", "order_status")),
+    ("order_detail", ("order_id", "order_product_id", "order_product_quantity", "order_line_item_total")),
+    ("order_shipping", ("order_id", "shipping_status", "shipping_date")),
+    ("product", ("dealer_id", "product_type_id", "item_price")),
+)
+
+
+def foreign_key_indexes():
+    """ One index per foreign key column of the schema """
+    indexes = []
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if column.foreign_keys:
+                indexes.append((table.name, (column.name,)))
+    return indexes
+
+
+PROFILES = {
+    "none": lambda: [],
+    "fk": foreign_key_indexes,
+    "covering": lambda: foreign_key_indexes() + list(COVERING),
+}
+
+
+def index_name(table_name, columns):
+    return PREFIX + table_name + "_" + "_".join(columns)
+
+
+def profile_indexes(name):
+    """
+    The indexes of a named profile
+    :params profile name, none, fk or covering
+    :return dict of index name to (table name, columns)
+    """
+    try:
+        indexes = PROFILES[name]()
+    except KeyError:
+        raise ValueError("Unknown index profile: {}".format(name))
+    return {index_name(table_name, columns): (table_name, columns) for table_name, columns in indexes}
+
+
+def build_index(name, table_name, columns):
+    table = Base.metadata.tables[table_name]
+    index = Index(name, *[table.c[column] for column in columns])
+    # managed by the profiles, keep it out of create_all
+    table.indexes.discard(index)
+    return index
+
+
+def apply_profile(engine, profile):
+    """
+    Create the indexes of a profile and drop the managed indexes it does not include
+    :params engine, profile name
+    :return (created, dropped) index counts
+    """
+    wanted = profile_indexes(profile)
+    inspector = inspect(engine)
+    existing = {}
+    for table in Base.metadata.sorted_tables:
+        for index in inspector.get_indexes(table.name):
+            if index["name"] and index["name"].startswith(PREFIX):
+                existing[index["name"]] = (table.name, tuple(index["column_names"]))
+
+    dropped = created = 0
+    for name, (table_name, columns) in existing.items():
+        if name not in wanted:
+            build_index(name, table_name, columns).drop(bind=engine)
+            dropped += 1
+    for name, (table_name, columns) in wanted.items():
+        if name not in existing:
+            build_index(name, table_name, columns).create(bind=engine)
+            created += 1
+    logger.info("Index profile {}: {} indexes created, {} dropped".format(profile, str(created), str(dropped)))
+    return created, dropped
+
+
+def compare(results):
+    """
+    Compare the runs of the index profiles against the first one
+    :params ordered dict of profile name to {"metrics": Metrics, "load": per table load stats}
+    :return report lines, latency and insert throughput deltas in percent
+    """
+    names = list(results)
+    baseline = results[names[0]]
+    base_summary = baseline["metrics"].summary()
+    lines = ["Index profiles compared against {}".format(names[0])]
+
+    lines.append("{:<36} {:<10} {:>9} {:>9} {:>9} {:>9}".format(
+        "operation", "profile", "p50", "delta", "p99", "delta"))
+    for operation, base in base_summary.items():
+        if operation.startswith(("load.", "pool.", "snapshot.")):
+            continue
+        for name in names:
+            s = results[name]["metrics"].summary().get(operation)
+            if s is None:
+                continue
+            lines.append("{:<36} {:<10} {:>9.3f} {:>+8.1f}% {:>9.3f} {:>+8.1f}%".format(
+                operation, name, s["p50"] * 1000, delta(s["p50"], base["p50"]),
+                s["p99"] * 1000, delta(s["p99"], base["p99"])))
+
+    lines.append("{:<36} {:<10} {:>9} {:>9}".format("table", "profile", "rows/sec", "delta"))
+    for table_name, base in baseline["load"].items():
+        for name in names:
+            stats = results[name]["load"].get(table_name)
+            if stats is None:
+                continue
+            lines.append("{:<36} {:<10} {:>9.0f} {:>+8.1f}%".format(
+                table_name, name, rate(stats), delta(rate(stats), rate(base))))
+    return lines
+
+
+def rate(stats):
+    return stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+
+
+def delta(value, base):
+    return (value - base) / base * 100.0 if base else 0.0
@@ -0,0 +1,85 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from profiler import normalize
+
+
+class LazyLoadDetector(object):
+    """
+    Count the lazy loads each ORM query sets off and flag N+1 patterns
+    :params threshold, lazy loads of one relationship per query execution tolerated before flagging
+    :return per query executions, lazy loads by relationship and N+1 executions
+    """
+
+    def __init__(self, threshold=1):
+        self.threshold = threshold
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.enabled = False
+
+    def enable(self):
+        if not self.enabled:
+            event.listen(Session, "do_orm_execute", self.do_orm_execute)
+            self.enabled = True
+
+    def disable(self):
+        if self.enabled:
+            event.remove(Session, "do_orm_execute", self.do_orm_execute)
+            self.enabled = False
+
+    def do_orm_execute(self, orm_execute_state):
+        # the load options, lazy_loaded_from among them, raise for inserts, updates and deletes
+        if not orm_execute_state.is_select:
+            return
+        if orm_execute_state.lazy_loaded_from is not None:
+            self.lazy_load(str(orm_execute_state.loader_strategy_path[-1]))
+        elif not orm_execute_state.is_relationship_load:
+            # a new originating query, eager loads (selectin etc.) belong to their parent
+            origin = normalize(str(orm_execute_state.statement))
+            self.local.origin = origin
+            self.local.loads = {}
+            self.local.flagged = False
+            with self.lock:
+                self.entry(origin)["executions"] += 1
+
+    def lazy_load(self, relationship):
+        origin = getattr(self.local, "origin", None)
+        if origin is None:
+            return
+        loads = self.local.loads
+        loads[relationship] = loads.get(relationship, 0) + 1
+        with self.lock:
+            entry = self.entry(origin)
+            entry["lazy_loads"] += 1
+            entry["relationships"][relationship] = entry["relationships"].get(relationship, 0) + 1
+            # flag each execution once, when a relationship first crosses the threshold
+            if loads[relationship] > self.threshold and not self.local.flagged:
+                self.local.flagged = True
+                entry["n_plus_one"] += 1
+
+    def entry(self, origin):
+        entry = self.stats.get(origin)
+        if entry is None:
+            entry = self.stats[origin] = {"executions": 0, "lazy_loads": 0, "n_plus_one": 0, "relationships": {}}
+        return entry
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def report(self, width=80):
+        """ Return the queries that set off lazy loads as table lines, N+1 offenders first """
+        with self.lock:
+            stats = [(origin, dict(entry)) for origin, entry in self.stats.items() if entry["lazy_loads"]]
+        stats.sort(key=lambda item: (item[1]["n_plus_one"], item[1]["lazy_loads"]), reverse=True)
+        lines = ["{:>10} {:>10} {:>6}  {:<32} {}".format("executions", "lazy loads", "N+1", "relationship", "query")]
+        for origin, entry in stats:
+            relationship = max(entry["relationships"].items(), key=lambda item: item[1])[0]
+            lines.append("{:>10} {:>10} {:>6}  {:<32} {}".format(
+                entry["executions"], entry["lazy_loads"], entry["n_plus_one"], relationship, origin[:width]))
+        return lines
+
+
+# the process wide detector, attached to every session when enabled
+registry = LazyLoadDetector()
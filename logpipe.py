@@ -0,0 +1,125 @@
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# all logs every row, sample one row in every N, count only counts them
+ROW_MODES = ("all", "sample", "count")
+
+
+class RowLog(object):
+    """
+    Per row log events, logged in full, sampled one in N or only counted, formatted only when logged
+    :params logger, row mode, sampling interval
+    :return None
+    """
+
+    def __init__(self, logger, mode="all", every=100):
+        self.logger = logger
+        self.local = threading.local()
+        self.thread_counts = []
+        self.lock = threading.Lock()
+        self.configure(mode, every)
+
+    def configure(self, mode="all", every=100):
+        if mode not in ROW_MODES:
+            raise ValueError("Unknown row log mode: {}".format(mode))
+        if every < 1:
+            raise ValueError("The row log sampling interval must be at least 1: {}".format(every))
+        self.mode = mode
+        self.every = every
+
+    def __call__(self, event, message, *args):
+        """ Count a row of the event and log it if the mode says so, message and args as for logger.info """
+        # counted per thread, no lock on the row path, summed for the report
+        counts = getattr(self.local, "counts", None)
+        if counts is None:
+            counts = self.local.counts = {}
+            with self.lock:
+                self.thread_counts.append(counts)
+        n = counts.get(event, 0)
+        counts[event] = n + 1
+        if self.mode == "all" or (self.mode == "sample" and n % self.every == 0):
+            self.logger.info(message, *args)
+
+    def reset(self):
+        with self.lock:
+            for counts in self.thread_counts:
+                counts.clear()
+
+    def to_dict(self):
+        """ The row counts of every thread, to hand back from a worker process """
+        with self.lock:
+            return [dict(counts) for counts in self.thread_counts if counts]
+
+    def merge(self, thread_counts):
+        """ Add the row counts handed back by worker processes or agents """
+        with self.lock:
+            self.thread_counts.extend(dict(counts) for counts in thread_counts)
+
+    def totals(self):
+        """ The rows seen and logged per event, over every thread """
+        totals = {}
+        with self.lock:
+            for counts in self.thread_counts:
+                for event, rows in list(counts.items()):
+                    seen, logged = totals.get(event, (0, 0))
+                    if self.mode == "all":
+                        sampled = rows
+                    elif self.mode == "sample":
+                        sampled = (rows + self.every - 1) // self.every
+                    else:
+                        sampled = 0
+                    totals[event] = (seen + rows, logged + sampled)
+        return totals
+
+    def report(self):
+        """ Return the rows seen and logged per event as report lines """
+        lines = ["{:<36} {:>10} {:>10}".format("row event", "rows", "logged")]
+        for event, (rows, logged) in sorted(self.totals().items()):
+            lines.append("{:<36} {:>10} {:>10}".format(event, str(rows), str(logged)))
+        return lines
+
+
+class QueuedLogging(object):
+    """
+    Hand the records of loggers to a background thread, their handlers' formatting and I/O move off the caller
+    :params logger names, their child loggers are covered as well
+    :return None
+    """
+
+    def __init__(self, names=("MAIN", "TASKS")):
+        self.names = names
+        self.handlers = {}
+        self.listeners = []
+
+    def start(self):
+        for name in self.names:
+            logger = logging.getLogger(name)
+            handlers = self.handlers[name] = list(logger.handlers)
+            records = queue.SimpleQueue()
+            # one listener per logger, so each logger's records only reach its own handlers
+            listener = QueueListener(records, *handlers, respect_handler_level=True)
+            for handler in handlers:
+                logger.removeHandler(handler)
+            logger.addHandler(QueueHandler(records))
+            listener.start()
+            self.listeners.append(listener)
+
+    def stop(self):
+        """ Write out the queued records and put the handlers back """
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners = []
+        for name, handlers in self.handlers.items():
+            logger = logging.getLogger(name)
+            for handler in list(logger.handlers):
+                if isinstance(handler, QueueHandler):
+                    logger.removeHandler(handler)
+            for handler in handlers:
+                logger.addHandler(handler)
+        self.handlers = {}
+
+
+# the process wide per row log of the show_* reads, worker processes hand their counts back
+registry = RowLog(logging.getLogger("MAIN"))
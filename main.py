@@ -7,10 +7,37 @@ import config
 import database
 import logging
 import time
+import resource
+import tracemalloc
+import workers
+import scheduler
+import profiler
+import distributed
+import asyncrunner
+import pools
+import indexes
+import lazyloads
+import tiers
+import exporter
+import distributions
+import logpipe
+import populate
+import traces
+import pragmas
+import idpool
+from sources import get_source
+from mix import Mix, run_plan
+from snapshot import make_snapshot
+from metrics import Metrics, registry
+from generator import generate
 from tasks import get_dealers, get_dealer_customers, get_dealer_customer_addresses, \
     get_dealer_locations, get_dealer_product_types, get_dealer_products, get_customer_orders, \
-    get_customer_order_details, get_customer_order_shipping
+    get_customer_order_details, get_customer_order_shipping, load_report, load_stats, reset_load_stats, \
+    failed_batches
+from collections import namedtuple
 from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import lazyload, selectinload, joinedload, raiseload
 from models import Dealer, Customer, Address, Location, Product, \
     ProductType, CustomerOrder, OrderDetail, OrderShipping
 
@@ -22,7 +49,29 @@ handler.setLevel(logging.INFO)
 formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 handler.setFormatter(formatter)
 logger.addHandler(handler)
-MQL = config.Config().QUERY_LIMIT
+# the per row lines of the reads, logged, sampled or only counted
+rows = logpipe.registry
+cfg = config.Config()
+MQL = cfg.QUERY_LIMIT
+READ_MODES = ("buffered", "stream", "columns", "core", "raw")
+# the read modes loading ORM entities, the others return plain rows
+ENTITY_MODES = ("buffered", "stream")
+LOADERS = {
+    "lazy": lazyload,
+    "selectin": selectinload,
+    "joined": joinedload,
+    "raise": raiseload,
+}
+# the relationships each read traverses when a loader strategy is selected for it
+RELATIONS = {
+    "show_dealer_customers": (Customer.dealer,),
+    "show_dealer_customer_addr": (Address.customer,),
+    "show_dealer_product_types": (ProductType.dealer,),
+    "show_dealer_products": (Product.product_type,),
+    "show_customer_orders": (CustomerOrder.customer,),
+    "show_customer_order_detail": (OrderDetail.order_product,),
+    "show_customer_order_shipping": (OrderShipping.order, OrderShipping.address, OrderShipping.order_detail),
+}
 
 
 class Workload(object):
@@ -32,102 +81,526 @@ class Workload(object):
     :return query
     """
 
+    OPERATIONS = (
+        "show_dealers",
+        "show_dealer_customers",
+        "show_dealer_customer_addr",
+        "show_dealer_product_types",
+        "show_dealer_products",
+        "show_customer_orders",
+        "show_customer_order_detail",
+        "show_customer_order_shipping",
+    )
+
+    def __init__(self, batch_size=None, source=None, scale_factor=None, seed=None, db=None, metrics=None,
+                 read_modes=None, trace_memory=False, mix=None, index_profile=None, loaders=None,
+                 key_distributions=None, log_rows=None, populate_workers=1):
+        self.db = db
+        self.metrics = metrics or registry
+        self.read_modes = read_modes or {}
+        self.loaders = loaders or {}
+        self.statements = {}
+        self.trace_memory = trace_memory
+        self.memory_peaks = {}
+        self.mix = Mix.load(mix, seed) if mix else None
+        self.position = 0
+        self.snapshot = None
+        self.index_profile = index_profile
+        self.batch_size = batch_size
+        self.source = source
+        self.scale_factor = scale_factor
+        self.seed = seed
+        self.populate_workers = populate_workers
+        if key_distributions:
+            # process wide, so process workers and agents pick keys the same way
+            distributions.registry.configure(key_distributions)
+        if log_rows:
+            rows.configure(*log_rows)
+
     def init_db(self):
-        self.db = database.db_session()
+        self.db = self.db or database.db_session()
         self.today = datetime.now().strftime("%c")
         try:
             database.init_db()
+            if self.index_profile:
+                indexes.apply_profile(database.engine, self.index_profile)
             logger.info("Database Initialized on: {}".format(self.today))
         except sqlalchemy.exc.SQLAlchemyError as err:
             logger.critical("Database initialization failure.: {}".format(str(err)))
             sys.exit(1)
 
-    def populate_data(self):
-        get_dealers()
-        get_dealer_customers()
-        get_dealer_customer_addresses()
-        get_dealer_locations()
-        get_dealer_product_types()
-        get_dealer_products()
-        get_customer_orders()
-        get_customer_order_details()
-        get_customer_order_shipping()
+    def populate_data(self, batch_size=None):
+        """ Seed the tables, each as soon as the tables it references are loaded, populate_workers at once """
+        batch_size = batch_size or self.batch_size
+        start = time.perf_counter()
+        if self.scale_factor:
+            timings = generate(self.scale_factor, self.seed, batch_size, self.populate_workers)
+        else:
+            source = get_source(self.source)
+            loaders = {
+                "dealer": get_dealers,
+                "customer": get_dealer_customers,
+                "address": get_dealer_customer_addresses,
+                "location": get_dealer_locations,
+                "product_type": get_dealer_product_types,
+                "product": get_dealer_products,
+                "customer_order": get_customer_orders,
+                "order_detail": get_customer_order_details,
+                "order_shipping": get_customer_order_shipping,
+            }
+            timings = populate.run_graph(
+                {name: lambda loader=loader: loader(batch_size, source) for name, loader in loaders.items()},
+                self.populate_workers)
+        wall = time.perf_counter() - start
+        for line in load_report():
+            logger.info("Load Report: {}".format(line))
+        for line in populate.report(timings, wall):
+            logger.info("Load Report: {}".format(line))
+        failed = failed_batches()
+        if failed:
+            # a partial load would be benchmarked as if it were complete
+            raise RuntimeError("Batches failed to load: {}".format(
+                ", ".join("{} {}".format(name, str(n)) for name, n in sorted(failed.items()))))
+
+    def take_snapshot(self):
+        """ Capture the seeded database as the baseline every iteration is reset to """
+        self.snapshot = make_snapshot(database.engine)
+        with self.metrics.timer("snapshot.take"):
+            self.snapshot.take()
 
+    def reset(self):
+        """ Restore the seeded baseline, discarding the writes of the last iteration """
+        self.db.close()
+        # the restore is not part of the workload, keep it out of a trace being recorded
+        with self.metrics.timer("snapshot.restore"), traces.registry.paused():
+            self.snapshot.restore()
 
     def run_workload(self):
-        self.populate_data()
-        self.show_dealers()
-        self.show_dealer_customers()
-        self.show_dealer_customer_addr()
-        self.show_dealer_product_types()
-        self.show_dealer_products()
-        self.show_customer_orders()
-        self.show_customer_order_detail()
-        self.show_customer_order_shipping()
+        for _ in self.operations():
+            self.run_operation(self.next_operation())
+
+    def operations(self):
+        """ The names of the operations this workload runs """
+        if self.mix:
+            return [op.name for op in self.mix.operations]
+        return list(self.OPERATIONS)
+
+    def next_operation(self):
+        """ A weighted random pick from the mix, otherwise the show_* reads in turn """
+        if self.mix:
+            return self.mix.choose()
+        name = self.OPERATIONS[self.position % len(self.OPERATIONS)]
+        self.position += 1
+        return name
+
+    def run_operation(self, name):
+        """ Run a single named workload operation, timed into the metrics, returns the rows read """
+        with self.metrics.timer(name):
+            if not self.trace_memory:
+                return self.dispatch(name)
+            tracemalloc.reset_peak()
+            try:
+                return self.dispatch(name)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+
+    def dispatch(self, name):
+        if self.mix:
+            if self.mix.due():
+                self.mix.refresh(self.db)
+            return run_plan(self.db, self.mix.plan(name), self.metrics, name)
+        return getattr(self, name)()
+
+    def read(self, name, model, columns, limit=MQL):
+        """
+        Query a table in the read mode and loader strategy selected for the operation
+        :params operation name, model, the columns the operation uses, row limit
+        :return list of entities when buffered, otherwise a streaming iterator
+        """
+        mode = self.read_modes.get(name, self.read_modes.get("default", "buffered"))
+        if mode not in READ_MODES:
+            raise ValueError("Unknown read mode: {}".format(mode))
+        if mode in ("core", "raw"):
+            return self.execute(name, model, columns, limit, mode)
+        loader = self.loaders.get(name, self.loaders.get("default"))
+        if loader and loader not in LOADERS:
+            raise ValueError("Unknown loader strategy: {}".format(loader))
+        # column tuples have no relationships to load
+        relations = RELATIONS.get(name, ()) if loader and mode in ENTITY_MODES else ()
+
+        query = self.db.query(*columns) if mode == "columns" else self.db.query(model)
+        if loader == "raise" and mode in ENTITY_MODES:
+            # fail on any lazy load instead of traversing the relationships
+            query = query.options(raiseload("*"))
+            relations = ()
+        elif relations:
+            query = query.options(*[LOADERS[loader](relation) for relation in relations])
+        if limit:
+            query = query.limit(limit)
+        if mode == "buffered":
+            rows = query.all()
+        else:
+            # server side cursor, rows are fetched and hydrated yield_per at a time
+            rows = query.execution_options(stream_results=True).yield_per(cfg.YIELD_PER)
+        return self.load_related(rows, relations) if relations else rows
 
+    def execute(self, name, model, columns, limit, mode):
+        """
+        Read the operation's columns without the ORM, a Core select or a raw DBAPI cursor
+        :params operation name, model, the columns the operation uses, row limit, core or raw
+        :return iterator of rows with attribute access
+        """
+        connection = self.db.connection()
+        cached = self.statements.get((name, mode))
+        if cached is None:
+            table = model.__table__
+            statement = select(*[table.c[column.key] for column in columns])
+            if limit:
+                statement = statement.limit(limit)
+            if mode == "raw":
+                # compiled to a string once, the cursor runs it with no SQLAlchemy in the path
+                sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+                statement = (sql, namedtuple(model.__name__ + "Row", [column.key for column in columns]))
+            cached = self.statements[(name, mode)] = statement
+        if mode == "core":
+            # the same statement object every time, so the engine's compiled cache always hits
+            return connection.execute(cached)
+        return self.fetch_raw(connection.connection.cursor(), *cached)
+
+    @staticmethod
+    def fetch_raw(cursor, sql, row):
+        try:
+            cursor.execute(sql)
+            yield from map(row._make, cursor)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def load_related(rows, relations):
+        """ Touch the relationships of every row, so the loader strategy's cost lands in the operation """
+        for row in rows:
+            for relation in relations:
+                getattr(row, relation.key)
+            yield row
 
     def show_dealers(self):
-        dealers = self.db.query(Dealer).limit(MQL).all()
+        dealers = self.read("show_dealers", Dealer, (Dealer.id, Dealer.name))
+        cnt = 0
         for dealer in dealers:
-            logger.info("Dealer: {}".format(dealer.name))
-        logger.info("{} Total Dealer Records".format(str(len(dealers))))
+            rows("show_dealers", "Dealer: %s", dealer.name)
+            cnt += 1
+        logger.info("{} Total Dealer Records".format(str(cnt)))
+        return cnt
 
     def show_dealer_customers(self):
-        customers = self.db.query(Customer).limit(MQL).all()
+        customers = self.read("show_dealer_customers", Customer,
+                              (Customer.id, Customer.first_name, Customer.last_name))
+        cnt = 0
         for c in customers:
-            logger.info("Customer {} Record: {} {}".format(c.id, c.first_name, c.last_name))
-        logger.info("{} Total Dealer Customer Records".format(str(len(customers))))
+            rows("show_dealer_customers", "Customer %s Record: %s %s", c.id, c.first_name, c.last_name)
+            cnt += 1
+        logger.info("{} Total Dealer Customer Records".format(str(cnt)))
+        return cnt
 
     def show_dealer_customer_addr(self):
-        addr = self.db.query(Address).limit(MQL).all()
+        addr = self.read("show_dealer_customer_addr", Address, (Address.id, Address.latitude, Address.longitude))
+        cnt = 0
         for a in addr:
-            logger.info("Customer ID: {} Address Record.  LatLong: {}/{}".format(str(a.id), str(a.latitude), str(a.longitude)))
-        logger.info("{} Total Customer Address Records".format(str(len(addr))))
+            rows("show_dealer_customer_addr", "Customer ID: %s Address Record.  LatLong: %s/%s", a.id, a.latitude, a.longitude)
+            cnt += 1
+        logger.info("{} Total Customer Address Records".format(str(cnt)))
+        return cnt
 
     def show_dealer_product_types(self):
-        pt = self.db.query(ProductType).all()
+        pt = self.read("show_dealer_product_types", ProductType,
+                       (ProductType.id, ProductType.dealer_id, ProductType.name), limit=None)
+        cnt = 0
         for p in pt:
-            logger.info("Dealer {} Product Type: {}".format(str(p.dealer_id), str(p.name)))
-        logger.info("{} Total Product Type Records".format(str(len(pt))))
+            rows("show_dealer_product_types", "Dealer %s Product Type: %s", p.dealer_id, p.name)
+            cnt += 1
+        logger.info("{} Total Product Type Records".format(str(cnt)))
+        return cnt
 
 
     def show_dealer_products(self):
-        products = self.db.query(Product).limit(MQL).all()
+        products = self.read("show_dealer_products", Product, (Product.id, Product.name))
+        cnt = 0
         for p in products:
-            logger.info("Dealer Product: {}".format(str(p.name)))
-        logger.info("{} Total Dealer Products.".format(str(len(products))))
+            rows("show_dealer_products", "Dealer Product: %s", p.name)
+            cnt += 1
+        logger.info("{} Total Dealer Products.".format(str(cnt)))
+        return cnt
 
 
     def show_customer_orders(self):
-        orders = self.db.query(CustomerOrder).limit(MQL).all()
+        orders = self.read("show_customer_orders", CustomerOrder,
+                           (CustomerOrder.id, CustomerOrder.customer_id, CustomerOrder.order_number,
+                            CustomerOrder.order_date))
+        cnt = 0
         for o in orders:
-            logger.info("Customer {} Order {} placed on {}".format(str(o.customer_id), str(o.order_number), str(o.order_date)))
-        logger.info("{} Total Customer Orders.".format(str(len(orders))))
+            rows("show_customer_orders", "Customer %s Order %s placed on %s", o.customer_id, o.order_number, o.order_date)
+            cnt += 1
+        logger.info("{} Total Customer Orders.".format(str(cnt)))
+        return cnt
 
     def show_customer_order_detail(self):
-        order_detail = self.db.query(OrderDetail).limit(MQL).all()
+        order_detail = self.read("show_customer_order_detail", OrderDetail, (OrderDetail.id, OrderDetail.order_id))
+        cnt = 0
         for order in order_detail:
-            logger.info("Customer Order Detail: {}".format(str(order.order_id)))
-        logger.info("{} Total Customer Order Detail".format(str(len(order_detail))))
+            rows("show_customer_order_detail", "Customer Order Detail: %s", order.order_id)
+            cnt += 1
+        logger.info("{} Total Customer Order Detail".format(str(cnt)))
+        return cnt
 
     def show_customer_order_shipping(self):
-        shipped = self.db.query(OrderShipping).all()
+        shipped = self.read("show_customer_order_shipping", OrderShipping,
+                            (OrderShipping.id, OrderShipping.shipping_date), limit=None)
+        cnt = 0
         for order in shipped:
-            logger.info("Customer Order Shipping Status: {} on {}".format(str(order.id), order.shipping_date))
-        logger.info("{} Total Orders Shipped".format(str(len(shipped))))
+            rows("show_customer_order_shipping", "Customer Order Shipping Status: %s on %s", order.id, order.shipping_date)
+            cnt += 1
+        logger.info("{} Total Orders Shipped".format(str(cnt)))
+        return cnt
+
+
+def run_index_profiles(profiles, duration=None, **kwargs):
+    """
+    Seed and run the same workload under each index profile, on a fresh schema every time
+    :params profile names, seconds to run each profile for or one iteration, Workload arguments
+    :return dict of profile name to its metrics and per table load stats
+    """
+    results = {}
+    for profile in profiles:
+        logger.info("Running the workload with index profile: {}".format(profile))
+        database.drop_db()
+        registry.reset()
+        reset_load_stats()
+        if kwargs.get("seed") is not None:
+            random.seed(kwargs["seed"])
+        profile_runner = Workload(index_profile=profile, **kwargs)
+        profile_runner.init_db()
+        profile_runner.populate_data()
+        start = time.time()
+        while True:
+            profile_runner.run_workload()
+            if duration is None or time.time() - start >= duration:
+                break
+        profile_runner.db.close()
+        results[profile] = {
+            "metrics": Metrics.from_dict(registry.to_dict()),
+            "load": {name: dict(stats) for name, stats in load_stats.items()},
+        }
+    return results
+
+
+def run_pragma_profiles(profiles, duration=None, **kwargs):
+    """
+    Seed and run the same workload under each SQLite pragma profile, on a new database file every time
+    :params profile names, seconds to run each profile for or one iteration, Workload arguments
+    :return dict of profile name to its metrics, per table load stats and seeding seconds
+    """
+    results = {}
+    for profile in profiles:
+        logger.info("Running the workload with pragma profile: {}".format(profile))
+        config.Config.SQLITE_PRAGMAS = pragmas.parse(profile)
+        database.db_session.remove()
+        database.engine.dispose()
+        pragmas.remove_database(config.Config.SQLALCHEMY_DATABASE_URI)
+        idpool.registry.clear()
+        database.configure_engine(pools.PoolMonitor(registry))
+        registry.reset()
+        reset_load_stats()
+        if kwargs.get("seed") is not None:
+            random.seed(kwargs["seed"])
+        profile_runner = Workload(**kwargs)
+        profile_runner.init_db()
+        logger.info("Pragmas in effect: {}".format(pragmas.effective(database.engine)))
+        seeding = time.perf_counter()
+        profile_runner.populate_data()
+        seconds = time.perf_counter() - seeding
+        start = time.time()
+        while True:
+            profile_runner.run_workload()
+            if duration is None or time.time() - start >= duration:
+                break
+        profile_runner.db.close()
+        results[profile] = {
+            "metrics": Metrics.from_dict(registry.to_dict()),
+            "load": {name: dict(stats) for name, stats in load_stats.items()},
+            "seconds": seconds,
+        }
+    return results
+
+
+def positive_minutes(text):
+    """ A --duration in minutes, rejecting zero and negative lengths """
+    minutes = float(text)
+    if minutes <= 0:
+        raise argparse.ArgumentTypeError("The duration must be greater than zero: {}".format(text))
+    return minutes
+
+
+def parse_read_modes(text):
+    """
+    Parse the read modes or loader strategies, i.e. "stream" or "columns,show_customer_orders=stream"
+    :params comma separated mode or operation=mode entries
+    :return dict of operation name to mode, the bare entry sets the default
+    """
+    modes = {}
+    for part in text.split(","):
+        name, _, mode = part.rpartition("=")
+        modes[name or "default"] = mode
+    return modes
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--duration", type=int, help="The length of time to run the workload, in minutes.")
+    parser.add_argument("--duration", type=positive_minutes, help="The length of time to run the workload, in minutes.")
     parser.add_argument("--database", type=str, help="Database type option, MySQL or SQLite3")
+    parser.add_argument("--database-url", type=str,
+                        help="Run against this database instead of Config.SQLALCHEMY_DATABASE_URI")
     parser.add_argument("--limit", type=int, help="Query limit in integer, i.e. 500")
-    
+    parser.add_argument("--batch-size", type=int, help="Rows per insert transaction when populating data, i.e. 1000")
+    parser.add_argument("--source", type=str, choices=["mockaroo", "local"],
+                        help="Seed data source, the Mockaroo API or the bundled data/*.json fixtures")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible data population")
+    parser.add_argument("--scale-factor", type=float,
+                        help="Generate synthetic data at a scale factor instead of using a data source, "
+                             "1.0 = 100k orders")
+    parser.add_argument("--populate-workers", type=int, default=1,
+                        help="Load up to N tables at once, each as soon as the tables it references are loaded")
+    parser.add_argument("--workers", type=int, help="Run the workload concurrently with N workers")
+    parser.add_argument("--backend", type=str, choices=sorted(workers.BACKENDS), default="thread",
+                        help="Worker pool backend, thread or process")
+    parser.add_argument("--qps", type=float, help="Issue operations open loop at a target rate for the duration")
+    parser.add_argument("--stages", type=str, help="Open loop rate stages as qps:seconds pairs, i.e. 10:30,50:60")
+    parser.add_argument("--arrival", type=str, choices=scheduler.ARRIVALS, default="constant",
+                        help="Open loop arrival process, constant or poisson")
+    parser.add_argument("--metrics-out", type=str, help="Write the latency histogram summary to a JSON file")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve live metrics in the Prometheus text format on http://localhost:PORT/metrics")
+    parser.add_argument("--timeseries-out", type=str,
+                        help="Write per second throughput, latency percentiles, counters and gauges to a CSV file")
+    parser.add_argument("--profile-sql", type=int, nargs="?", const=10,
+                        help="Profile SQL statements instead of echoing them, report the top N by total time")
+    parser.add_argument("--read-mode", type=str,
+                        help="Read mode buffered, stream or columns, for all reads or per operation, "
+                             "i.e. columns,show_customer_orders=stream")
+    parser.add_argument("--tiers", type=str, nargs="?", const=",".join(tiers.TIERS),
+                        help="Run every read at each execution tier and compare throughput and CPU per row, "
+                             "i.e. buffered,columns,core,raw")
+    parser.add_argument("--loader", type=str,
+                        help="Load the relationships of the reads lazy, selectin, joined or raise, "
+                             "for all reads or per operation, i.e. selectin,show_customer_orders=joined")
+    parser.add_argument("--detect-n-plus-one", type=int, nargs="?", const=1,
+                        help="Count the lazy loads of every query and flag those loading one relationship "
+                             "more than N times per execution")
+    parser.add_argument("--key-distribution", type=str,
+                        help="Key distribution uniform, zipf:S, hotspot:KEYS:TRAFFIC or latest:S for the dealer, "
+                             "customer and customer_order ids, or per table, i.e. zipf:1.1,customer=hotspot:0.1:0.9")
+    parser.add_argument("--key-histogram-out", type=str,
+                        help="Write the histogram of keys touched per table to a JSON file")
+    parser.add_argument("--log-rows", type=str, choices=logpipe.ROW_MODES,
+                        help="Log every row the reads fetch, sample one in --log-sample rows or only count them; "
+                             "sample and count also write the logs from a background thread")
+    parser.add_argument("--log-sample", type=int, default=100, help="Log one row in N with --log-rows sample")
+    parser.add_argument("--log-queue", action="store_true",
+                        help="Write the logs from a background thread through a queue")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Report the peak Python memory allocated by each operation")
+    parser.add_argument("--mix", type=str, help="Run a weighted operation mix from a JSON or TOML file")
+    parser.add_argument("--reset", action="store_true",
+                        help="Snapshot the seeded database and restore it before every iteration")
+    parser.add_argument("--index-profile", type=str, choices=sorted(indexes.PROFILES),
+                        help="Secondary indexes to create with the schema, none, fk or covering")
+    parser.add_argument("--index-ab", type=str,
+                        help="Seed and run the workload under each index profile and compare, i.e. none,fk,covering")
+    parser.add_argument("--pragmas", type=str,
+                        help="SQLite pragmas applied on connect, a profile ({}) or pairs like "
+                             "journal_mode=WAL,synchronous=NORMAL".format(", ".join(sorted(pragmas.PROFILES))))
+    parser.add_argument("--pragma-matrix", type=str, nargs="?", const=",".join(pragmas.PROFILES),
+                        help="Seed and run the workload on a new SQLite database under each pragma profile "
+                             "and compare, i.e. default,wal_normal,wal_cached")
+    parser.add_argument("--pool", type=str, choices=sorted(pools.POOLS),
+                        help="Connection pool class, the dialect default when not set")
+    parser.add_argument("--pool-size", type=int, help="Connections kept open by a queue pool")
+    parser.add_argument("--max-overflow", type=int, help="Connections a queue pool may open beyond its size")
+    parser.add_argument("--pool-timeout", type=float, help="Seconds to wait for a connection before giving up")
+    parser.add_argument("--pool-recycle", type=int, help="Replace connections older than this many seconds")
+    parser.add_argument("--pool-pre-ping", action="store_true", help="Test connections on checkout")
+    parser.add_argument("--async", dest="concurrency", type=int,
+                        help="Run the --mix operations on an asyncio engine with N operations in flight")
+    parser.add_argument("--trace-out", type=str,
+                        help="Record every statement, commit and rollback of the workload to a trace file, "
+                             "gzipped when it ends in .gz")
+    parser.add_argument("--replay", type=str,
+                        help="Replay a trace file instead of running a workload, seeding first only when "
+                             "--scale-factor or --source is given")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Replay at N times the recorded pace, 0 for as fast as possible")
+    parser.add_argument("--agents", type=int,
+                        help="Coordinate the run across N agents, each running --workers workers")
+    parser.add_argument("--agent", action="store_true", help="Run as an agent of a coordinator")
+    parser.add_argument("--local-agents", action="store_true",
+                        help="Start the coordinator's agents as local processes")
+    parser.add_argument("--broker", type=str, choices=sorted(distributed.BROKERS), default="socket",
+                        help="Coordinator and agent transport, a socket or the redis broker")
+    parser.add_argument("--broker-url", type=str,
+                        help="Coordinator host:port for the socket broker or the redis url, "
+                             "defaults to Config.COORDINATOR_URL or Config.CELERY_BROKER_URL")
+    queued = None
     try:
         args = parser.parse_args()
-        duration = int(args.duration * 60)
+        duration = args.duration * 60 if args.duration is not None else None
+        if args.seed is not None:
+            random.seed(args.seed)
+        if args.profile_sql:
+            config.Config.SQLALCHEMY_ECHO = False
+            profiler.registry.enable()
+        engine_settings = {
+            "POOL_CLASS": args.pool,
+            "POOL_SIZE": args.pool_size,
+            "POOL_MAX_OVERFLOW": args.max_overflow,
+            "POOL_TIMEOUT": args.pool_timeout,
+            "POOL_RECYCLE": args.pool_recycle,
+            "POOL_PRE_PING": args.pool_pre_ping,
+            "SQLITE_PRAGMAS": pragmas.parse(args.pragmas) if args.pragmas else None,
+        }
+        for name, value in engine_settings.items():
+            setattr(config.Config, name, value)
+        if args.database_url:
+            config.Config.SQLALCHEMY_DATABASE_URI = args.database_url
+        database.configure_engine(pools.PoolMonitor(registry))
+        live = None
+        if args.metrics_port or args.timeseries_out:
+            live = exporter.LiveExporter(args.metrics_port, args.timeseries_out)
+            live.start()
+        options = {
+            "read_modes": parse_read_modes(args.read_mode) if args.read_mode else None,
+            "trace_memory": args.trace_memory,
+            "mix": args.mix,
+            "loaders": parse_read_modes(args.loader) if args.loader else None,
+            "key_distributions": parse_read_modes(args.key_distribution) if args.key_distribution else None,
+            "log_rows": (args.log_rows, args.log_sample) if args.log_rows else None,
+        }
+        if args.log_queue or args.log_rows in ("sample", "count"):
+            queued = logpipe.QueuedLogging()
+            queued.start()
+        if args.detect_n_plus_one:
+            lazyloads.registry.threshold = args.detect_n_plus_one
+            lazyloads.registry.enable()
+        if args.trace_memory:
+            tracemalloc.start()
+        if args.agent:
+            logger.info("Starting workload agent, waiting for the coordinator.")
+            distributed.run_agent(Workload, distributed.get_broker(args.broker, args.broker_url))
+            sys.exit(0)
         try:
-            runner = Workload()
+            runner = Workload(batch_size=args.batch_size, source=args.source,
+                              scale_factor=args.scale_factor, seed=args.seed,
+                              index_profile=args.index_profile, populate_workers=args.populate_workers,
+                              **options)
             logger.info("Starting up database workload runner with default params.")
             runner.init_db()
             logger.info("Create database schema.  Please wait...")
@@ -136,27 +609,178 @@ if __name__ == "__main__":
 
             try:
                 logger.info("Populating table data, this will only take a minute.")
-                # start populating data
-                runner.populate_data()
+                # start populating data, each index profile seeds its own, a replay target may be seeded already
+                if not args.index_ab and not args.pragma_matrix and (not args.replay or args.scale_factor or args.source):
+                    runner.populate_data()
+                if args.key_distribution:
+                    logger.info("Keys picked while seeding:")
+                    for line in distributions.registry.report():
+                        logger.info(line)
+                    distributions.registry.reset()
+                if args.reset:
+                    runner.take_snapshot()
+                    logger.info("Snapshot of the seeded database taken.")
                 logger.info("Starting database workload runner.  Max queries set to: {}".format(str(MQL)))
-                
-                while True:
-                    current_time = time.time()
-                    # run the workload
-                    runner.run_workload()
-                    logger.warning("Sleeping for 5 seconds, resuming in 4, 3, 2, 1...")
-                    time.sleep(5.0)
-                    
-                    if args.duration:
-                        if (current_time - start_time) <= duration:
+                if args.trace_out:
+                    settings = {"scale_factor": args.scale_factor, "seed": args.seed, "source": args.source,
+                                "mix": args.mix}
+                    traces.registry.start(args.trace_out, database.engine.dialect, settings)
+                    logger.info("Recording the workload to: {}".format(args.trace_out))
+
+                if args.tiers:
+                    results = tiers.run_tiers(runner, args.tiers.split(","), duration=duration)
+                    for line in tiers.report(results):
+                        logger.info(line)
+
+                elif args.index_ab:
+                    results = run_index_profiles(args.index_ab.split(","), duration, batch_size=args.batch_size,
+                                                 source=args.source, scale_factor=args.scale_factor,
+                                                 seed=args.seed, populate_workers=args.populate_workers,
+                                                 **options)
+                    for line in indexes.compare(results):
+                        logger.info(line)
+                    registry.reset()
+                    for profile, result in results.items():
+                        registry.merge(result["metrics"], prefix=profile + ".")
+
+                elif args.pragma_matrix:
+                    results = run_pragma_profiles(args.pragma_matrix.split(","), duration,
+                                                  batch_size=args.batch_size, source=args.source,
+                                                  scale_factor=args.scale_factor, seed=args.seed,
+                                                  populate_workers=args.populate_workers, **options)
+                    for line in pragmas.compare(results):
+                        logger.info(line)
+                    registry.reset()
+                    for profile, result in results.items():
+                        registry.merge(result["metrics"], prefix=profile + ".")
+
+                elif args.replay:
+                    replayer = traces.Replayer(database.engine, args.replay, args.replay_speed)
+                    logger.info("Replaying {}, recorded with {}".format(args.replay, replayer.header["settings"]))
+                    replayer.run()
+                    for line in replayer.report():
+                        logger.info(line)
+                    registry.merge(replayer.metrics)
+
+                elif args.agents:
+                    # one merged report from every agent's slice of the run
+                    plan = {
+                        "workers": args.workers or (8 if args.qps or args.stages else 1),
+                        "backend": args.backend,
+                        "duration": duration,
+                        "iterations": 1,
+                        "stages": scheduler.parse_stages(args.stages) if args.stages else
+                        [(args.qps, duration or 60)] if args.qps else None,
+                        "arrival": args.arrival,
+                        "seed": args.seed,
+                        "options": options,
+                        "uri": config.Config.SQLALCHEMY_DATABASE_URI,
+                        "echo": config.Config.SQLALCHEMY_ECHO,
+                        "pool": engine_settings,
+                        "profile": bool(args.profile_sql),
+                    }
+                    broker = distributed.get_broker(args.broker, args.broker_url)
+                    agents = distributed.spawn_agents(Workload, args.agents, args.broker, args.broker_url) \
+                        if args.local_agents else []
+                    logger.info("Coordinating {} agents over the {} broker.".format(str(args.agents), args.broker))
+                    try:
+                        results = distributed.Coordinator(args.agents, broker).run(plan)
+                    finally:
+                        for agent in agents:
+                            agent.join()
+                    for line in distributed.report(results):
+                        logger.info(line)
+                    registry.merge(distributed.merge_results(results))
+
+                elif args.concurrency:
+                    if not args.mix:
+                        raise ValueError("--async runs the operations of a --mix file")
+                    logger.info("Running {} concurrent async operations.".format(str(args.concurrency)))
+                    async_runner = asyncrunner.AsyncRunner(args.mix, args.concurrency, duration=duration,
+                                                           seed=args.seed)
+                    stats = async_runner.run()
+                    for line in asyncrunner.report(stats):
+                        logger.info(line)
+                    registry.merge(async_runner.metrics)
+
+                elif args.qps or args.stages:
+                    # open loop, the workers size the pool issuing the scheduled operations
+                    stages = scheduler.parse_stages(args.stages) if args.stages else [(args.qps, duration or 60)]
+                    logger.info("Running open loop schedule: {} ({} arrivals)".format(stages, args.arrival))
+                    schedule = scheduler.OpenLoopScheduler(Workload, stages, args.arrival,
+                                                           workers=args.workers or 8, seed=args.seed,
+                                                           options=options)
+                    stats = schedule.run()
+                    for line in scheduler.report(stats, schedule.metrics):
+                        logger.info(line)
+                    registry.merge(schedule.metrics)
+                    registry.merge(schedule.service, prefix="service.")
+
+                elif args.workers:
+                    logger.info("Running {} {} workers.".format(str(args.workers), args.backend))
+                    stats, wall = workers.run_workers(Workload, args.workers, args.backend, duration=duration,
+                                                      options=options, seed=args.seed)
+                    for line in workers.report(stats, wall):
+                        logger.info(line)
+                    registry.merge(workers.merge_metrics(stats))
+
+                else:
+                    while True:
+                        # run the workload
+                        runner.run_workload()
+                        logger.warning("Sleeping for 5 seconds, resuming in 4, 3, 2, 1...")
+                        time.sleep(5.0)
+
+                        if duration is not None and (time.time() - start_time) >= duration:
                             break
+                        if runner.snapshot:
+                            runner.reset()
+                            logger.info("Database reset to the seeded snapshot.")
 
             except sqlalchemy.exc.SQLAlchemyError as db_err:
                 logger.critical("Database exception: {}".format(str(db_err)))
 
+            finally:
+                if args.trace_out:
+                    traces.registry.stop()
+                    logger.info("{} statements recorded to: {}".format(str(traces.registry.count), args.trace_out))
+                for line in registry.report():
+                    logger.info(line)
+                if args.profile_sql:
+                    for line in profiler.registry.report(args.profile_sql):
+                        logger.info(line)
+                if live:
+                    live.stop()
+                if args.detect_n_plus_one:
+                    for line in lazyloads.registry.report():
+                        logger.info(line)
+                if args.key_distribution:
+                    logger.info("Keys picked by the workload:")
+                    for line in distributions.registry.report():
+                        logger.info(line)
+                if args.key_histogram_out:
+                    distributions.registry.export(args.key_histogram_out)
+                    logger.info("Key histogram written to: {}".format(args.key_histogram_out))
+                if runner.snapshot:
+                    runner.snapshot.drop()
+                for name, peak in sorted(runner.memory_peaks.items()):
+                    logger.info("Peak memory {}: {:.1f} KiB".format(name, peak / 1024.0))
+                logger.info("Peak RSS: {:.1f} MiB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+                if args.metrics_out:
+                    registry.export(args.metrics_out)
+                    logger.info("Metrics written to: {}".format(args.metrics_out))
+                if args.log_rows:
+                    for line in rows.report():
+                        logger.info(line)
+
         except Exception as e:
             logger.critical("Application exception occurred: {}".format(str(e)))
 
     except argparse.ArgumentTypeError as ate:
         logger.critical("Argument Error: {}".format(str(ate)))
         sys.exit(1)
+
+    finally:
+        # write out the records still queued
+        if queued:
+            queued.stop()
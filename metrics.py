@@ -0,0 +1,271 @@
+import json
+import time
+import threading
+
+# values below 2**SUB_BITS microseconds get their own bucket, above that every power
+# of two is split into 2**(SUB_BITS - 1) buckets, keeping the relative error within
+# 1 / 2**(SUB_BITS - 1), about 1.6%
+SUB_BITS = 7
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# while live export is enabled, new registries also record into this one
+live = None
+
+
+def bucket_index(value):
+    """ Map a value in microseconds to its log-linear bucket """
+    if value < (1 << SUB_BITS):
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return (shift << (SUB_BITS - 1)) + (value >> shift)
+
+
+def bucket_value(index):
+    """ The highest value in microseconds that maps to a bucket """
+    if index < (1 << SUB_BITS):
+        return index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BITS - 1))
+    return ((mantissa + 1) << shift) - 1
+
+
+class Histogram(object):
+    """
+    An HDR style log bucketed latency histogram
+    :params latencies in seconds
+    :return percentiles in seconds
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.start = None
+        self.end = None
+
+    def record(self, seconds, error=False):
+        value = max(0, int(seconds * 1000000))
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.errors += int(error)
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+        now = time.time()
+        self.start = now - seconds if self.start is None else min(self.start, now - seconds)
+        self.end = now if self.end is None else max(self.end, now)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.start is not None:
+            self.start = other.start if self.start is None else min(self.start, other.start)
+            self.end = other.end if self.end is None else max(self.end, other.end)
+        return self
+
+    def percentile(self, p):
+        """ The value in seconds at or below which p percent of the recorded values fall """
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(p / 100.0 * self.count + 0.4999)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max) / 1000000.0
+        return self.max / 1000000.0
+
+    def window(self, previous=None):
+        """ A histogram of the values recorded since a previous copy of this one """
+        window = Histogram()
+        for index, count in self.counts.items():
+            count -= previous.counts.get(index, 0) if previous else 0
+            if count:
+                window.counts[index] = count
+        window.count = self.count - (previous.count if previous else 0)
+        window.errors = self.errors - (previous.errors if previous else 0)
+        window.total = self.total - (previous.total if previous else 0)
+        if window.counts:
+            # the exact extremes are gone, the bucket bounds stand in
+            window.min = bucket_value(min(window.counts))
+            window.max = bucket_value(max(window.counts))
+        return window
+
+    def mean(self):
+        return self.total / self.count / 1000000.0 if self.count else 0.0
+
+    def throughput(self):
+        """ Values recorded per second over the window they were recorded in """
+        if not self.count or self.end is None or self.end <= self.start:
+            return 0.0
+        return self.count / (self.end - self.start)
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "errors": self.errors,
+            "throughput": self.throughput(),
+            "mean": self.mean(),
+            "min": (self.min or 0) / 1000000.0,
+            "max": self.max / 1000000.0,
+        }
+        for p in PERCENTILES:
+            summary["p{:g}".format(p)] = self.percentile(p)
+        return summary
+
+    def to_dict(self):
+        return {
+            "counts": {str(k): v for k, v in self.counts.items()},
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "start": self.start,
+            "end": self.end,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(k): v for k, v in data["counts"].items()}
+        for key in ("count", "errors", "total", "min", "max", "start", "end"):
+            setattr(histogram, key, data[key])
+        return histogram
+
+
+class Timer(object):
+    """ Context manager recording the time spent in its block """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+
+class Metrics(object):
+    """
+    A thread safe registry of named latency histograms, counters and gauges
+    :params operation name, latency in seconds, a registry to also record into
+    :return summary
+    """
+
+    def __init__(self, tap=None):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.tap = tap or live
+
+    def record(self, name, seconds, error=False):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds, error)
+        if self.tap is not None:
+            self.tap.record(name, seconds, error)
+
+    def increment(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        if self.tap is not None:
+            self.tap.increment(name, n)
+
+    def gauge(self, name, value):
+        """ Set a gauge, its high water mark is kept alongside """
+        with self.lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = {"value": 0, "max": value}
+            gauge["value"] = value
+            gauge["max"] = max(gauge["max"], value)
+        if self.tap is not None:
+            self.tap.gauge(name, value)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def merge(self, other, prefix=""):
+        with self.lock:
+            for name, histogram in other.histograms.items():
+                self.histograms.setdefault(prefix + name, Histogram()).merge(histogram)
+            for name, count in other.counters.items():
+                self.counters[prefix + name] = self.counters.get(prefix + name, 0) + count
+            for name, gauge in other.gauges.items():
+                # the largest reading of any source, for the value as for the high water mark
+                merged = self.gauges.setdefault(prefix + name, {"value": gauge["value"], "max": gauge["max"]})
+                merged["value"] = max(merged["value"], gauge["value"])
+                merged["max"] = max(merged["max"], gauge["max"])
+        return self
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def summary(self):
+        with self.lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def report(self):
+        """ Return the summary as table lines, latencies in milliseconds """
+        lines = ["{:<36} {:>8} {:>6} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "operation", "count", "errors", "ops/sec", "p50", "p90", "p99", "p99.9", "max")]
+        for name, s in self.summary().items():
+            lines.append("{:<36} {:>8} {:>6} {:>10.1f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                name, s["count"], s["errors"], s["throughput"], s["p50"] * 1000, s["p90"] * 1000,
+                s["p99"] * 1000, s["p99.9"] * 1000, s["max"] * 1000))
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted((name, dict(gauge)) for name, gauge in self.gauges.items())
+        for name, count in counters:
+            lines.append("{:<36} {:>8}".format(name, count))
+        for name, gauge in gauges:
+            lines.append("{:<36} {:>8} (max {})".format(name, gauge["value"], gauge["max"]))
+        return lines
+
+    def export(self, path):
+        """ Write the summary, the counters, the gauges and the raw histograms as JSON """
+        data = self.to_dict()
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "counters": data["counters"], "gauges": data["gauges"],
+                       "histograms": data["histograms"]}, f, indent=2)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+                "counters": dict(self.counters),
+                "gauges": {name: dict(gauge) for name, gauge in self.gauges.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        metrics.histograms = {name: Histogram.from_dict(h) for name, h in data["histograms"].items()}
+        metrics.counters = dict(data.get("counters", {}))
+        metrics.gauges = {name: dict(gauge) for name, gauge in data.get("gauges", {}).items()}
+        return metrics
+
+
+# the process wide registry used by the loaders and the single threaded runner
+registry = Metrics()
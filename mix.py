@@ -0,0 +1,374 @@
+import json
+import time
+import random
+import string
+import bisect
+import itertools
+from datetime import datetime
+import models
+import distributions
+from sqlalchemy import select, func, text
+from database import Base
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+def table(name):
+    """ Look up a table of the schema by name """
+    try:
+        return Base.metadata.tables[name]
+    except KeyError:
+        raise ValueError("Unknown table: {}".format(name))
+
+
+class KeyRange(object):
+    """ The primary key range of a table, refreshed from the database """
+
+    def __init__(self, table_name):
+        self.table = table(table_name)
+        self.low = 0
+        self.high = 0
+
+    def refresh(self, session):
+        low, high = session.execute(select(func.min(self.table.c.id), func.max(self.table.c.id))).one()
+        self.low, self.high = low or 0, high or 0
+
+    def pick(self, rng):
+        if not self.high:
+            return None
+        return distributions.registry.pick(self.table.name, rng, self.low, self.high - self.low + 1)
+
+
+def param_generator(spec, keys):
+    """
+    Build a parameter generator from its spec
+    :params spec dict with a type, key ranges by table name
+    :return function of the random generator
+    """
+    kind = spec.get("type", "key")
+
+    if kind == "key":
+        key_range = keys.setdefault(spec["table"], KeyRange(spec["table"]))
+        return key_range.pick
+    if kind == "int":
+        return lambda rng: rng.randint(spec["min"], spec["max"])
+    if kind == "float":
+        return lambda rng: round(rng.uniform(spec["min"], spec["max"]), spec.get("digits", 2))
+    if kind == "choice":
+        return lambda rng: rng.choice(spec["values"])
+    if kind == "string":
+        length = spec.get("length", 8)
+        return lambda rng: spec.get("prefix", "") + "".join(rng.choices(string.ascii_lowercase, k=length))
+    if kind == "value":
+        return lambda rng: spec["value"]
+    if kind == "now":
+        return lambda rng: datetime.now()
+    if kind == "list":
+        item = param_generator(spec["item"], keys)
+        return lambda rng: [item(rng) for _ in range(rng.randint(spec.get("min", 1), spec.get("max", 5)))]
+    raise ValueError("Unknown parameter type: {}".format(kind))
+
+
+# each operation kind builds a plan: a generator that yields statements, is sent
+# each result back, and returns the number of rows it touched, so the same
+# definitions run on a synchronous Session or an AsyncSession
+
+def point_lookup(spec):
+    t = table(spec["table"])
+
+    def plan(params):
+        result = yield select(t).where(t.c.id == params["id"])
+        return len(result.fetchall())
+    return plan
+
+
+def fk_scan(spec):
+    t = table(spec["table"])
+    column = t.c[spec["column"]]
+    limit = spec.get("limit", 100)
+
+    def plan(params):
+        result = yield select(t).where(column == params["value"]).limit(limit)
+        return len(result.fetchall())
+    return plan
+
+
+def range_scan(spec):
+    t = table(spec["table"])
+    span = spec.get("span", 100)
+
+    def plan(params):
+        result = yield select(t).where(t.c.id.between(params["low"], params["low"] + span))
+        return len(result.fetchall())
+    return plan
+
+
+def order_lines(spec):
+    def plan(params):
+        result = yield select(
+            models.CustomerOrder.order_number, models.Product.name,
+            models.OrderDetail.order_product_quantity, models.OrderDetail.order_line_item_total
+        ).join(
+            models.OrderDetail, models.OrderDetail.order_id == models.CustomerOrder.id
+        ).join(
+            models.Product, models.Product.id == models.OrderDetail.order_product_id
+        ).where(models.CustomerOrder.id == params["id"])
+        return len(result.fetchall())
+    return plan
+
+
+def aggregate(spec):
+    t = table(spec["table"])
+    column = t.c[spec["column"]]
+    measure = t.c[spec["measure"]] if spec.get("measure") else None
+    functions = [func.count()] + ([func.sum(measure), func.avg(measure)] if measure is not None else [])
+
+    def plan(params):
+        statement = select(*functions)
+        if "value" in params:
+            statement = statement.where(column == params["value"])
+        else:
+            statement = statement.add_columns(column).group_by(column)
+        result = yield statement
+        return len(result.fetchall())
+    return plan
+
+
+def insert(spec):
+    t = table(spec["table"])
+
+    def plan(params):
+        result = yield t.insert().values(**params)
+        return result.rowcount
+    return plan
+
+
+def update(spec):
+    t = table(spec["table"])
+
+    def plan(params):
+        values = {k: v for k, v in params.items() if k != "id"}
+        result = yield t.update().where(t.c.id == params["id"]).values(**values)
+        return result.rowcount
+    return plan
+
+
+def sql(spec):
+    statement = text(spec["sql"])
+    returns_rows = spec["sql"].lstrip().lower().startswith(("select", "with"))
+
+    def plan(params):
+        result = yield statement.bindparams(**params)
+        return len(result.fetchall()) if returns_rows else result.rowcount
+    return plan
+
+
+def new_order(spec):
+    """ TPC-C style new order: an order, its priced lines, a shipping record and a status update """
+    orders = models.CustomerOrder.__table__
+    details = models.OrderDetail.__table__
+    shipping = models.OrderShipping.__table__
+
+    def plan(params):
+        result = yield select(models.Customer.id, models.Customer.dealer_id).where(
+            models.Customer.id == params["customer_id"])
+        customer = result.first()
+        result = yield select(models.Address.id).where(models.Address.customer_id == params["customer_id"]).limit(1)
+        address_id = result.scalar()
+        result = yield select(models.Product.id, models.Product.item_price).where(
+            models.Product.id.in_(params["product_ids"]))
+        products = result.fetchall()
+        if customer is None or address_id is None or not products:
+            return 0
+
+        result = yield orders.insert().values(
+            dealer_id=customer.dealer_id,
+            customer_id=customer.id,
+            order_number="{}-{}".format(customer.id, params.get("order_number", 0)),
+            order_date=datetime.now(),
+            order_status=False
+        )
+        order_id = result.inserted_primary_key[0]
+
+        quantities = params.get("quantities") or [1]
+        detail_ids = []
+        for i, product in enumerate(products):
+            quantity = quantities[i % len(quantities)]
+            price = product.item_price or 0.0
+            result = yield details.insert().values(
+                order_id=order_id,
+                order_product_id=product.id,
+                order_product_quantity=quantity,
+                order_product_item_price=price,
+                order_line_item_total=round(quantity * price, 2)
+            )
+            detail_ids.append(result.inserted_primary_key[0])
+
+        yield shipping.insert().values(
+            address_id=address_id,
+            order_id=order_id,
+            order_detail_id=detail_ids[0],
+            shipping_date=datetime.now(),
+            shipping_status="Awaiting Shipment",
+            shipping_tracking_number=params.get("tracking_number", ""),
+            shipping_carrier=params.get("carrier", "FedEx"),
+            shipping_delivered=False,
+            shipping_final_disposition="NOT DELIVERED"
+        )
+        yield orders.update().where(orders.c.id == order_id).values(order_status=True)
+        return len(detail_ids) + 3
+    return plan
+
+
+KINDS = {
+    "point_lookup": point_lookup,
+    "fk_scan": fk_scan,
+    "range_scan": range_scan,
+    "order_lines": order_lines,
+    "aggregate": aggregate,
+    "insert": insert,
+    "update": update,
+    "sql": sql,
+    "new_order": new_order,
+}
+
+
+class Operation(object):
+    """ A named, weighted operation of a mix with its parameter generators """
+
+    def __init__(self, spec, keys):
+        self.name = spec["name"]
+        self.weight = float(spec.get("weight", 1))
+        try:
+            self.plan = KINDS[spec["kind"]](spec)
+        except KeyError:
+            raise ValueError("Unknown operation kind: {}".format(spec.get("kind")))
+        self.params = {name: param_generator(p, keys) for name, p in spec.get("params", {}).items()}
+
+    def new_plan(self, rng):
+        return self.plan({name: generate(rng) for name, generate in self.params.items()})
+
+
+class Mix(object):
+    """
+    A weighted workload mix loaded from a JSON or TOML file
+    :params mix definition dict
+    :return randomized operations
+    """
+
+    def __init__(self, definition, seed=None):
+        self.name = definition.get("name", "mix")
+        self.keys = {}
+        self.operations = [Operation(spec, self.keys) for spec in definition["operations"]]
+        self.by_name = {op.name: op for op in self.operations}
+        self.cum_weights = list(itertools.accumulate(op.weight for op in self.operations))
+        self.rng = random.Random(definition.get("seed") if seed is None else seed)
+        # seconds between key range refreshes, so the keys inserted during the run are picked as well
+        self.refresh_every = float(definition.get("refresh_every", 1.0))
+        self.refreshed = None
+
+    @classmethod
+    def load(cls, path, seed=None):
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise ValueError("Reading TOML mix files requires Python 3.11 or the tomli package")
+            with open(path, "rb") as f:
+                return cls(tomllib.load(f), seed)
+        with open(path) as f:
+            return cls(json.load(f), seed)
+
+    def refresh(self, session):
+        """ Refresh the key ranges the parameter generators pick from """
+        self.refreshed = time.monotonic()
+        for key_range in self.keys.values():
+            key_range.refresh(session)
+
+    def due(self):
+        """ Claim the next key range refresh, True at most once every refresh_every seconds """
+        now = time.monotonic()
+        if self.refreshed is not None and now - self.refreshed < self.refresh_every:
+            return False
+        self.refreshed = now
+        return True
+
+    def choose(self):
+        """ Pick an operation name by weight """
+        i = bisect.bisect_right(self.cum_weights, self.rng.random() * self.cum_weights[-1])
+        return self.operations[min(i, len(self.operations) - 1)].name
+
+    def plan(self, name):
+        return self.by_name[name].new_plan(self.rng)
+
+
+def lock_error(err):
+    """ Classify a database error as a deadlock or lock timeout, None otherwise """
+    orig = getattr(err, "orig", err)
+    code = orig.args[0] if getattr(orig, "args", None) else None
+    message = str(orig).lower()
+    if code == 1213 or "deadlock" in message:
+        return "deadlock"
+    if code == 1205 or "lock wait timeout" in message or "database is locked" in message:
+        return "lock_timeout"
+    return None
+
+
+def run_plan(session, plan, metrics=None, name=None):
+    """
+    Drive a plan on a synchronous session in one transaction
+    :params session, plan, metrics to record commit latency and rollbacks under the operation name
+    :return the rows the plan touched
+    """
+    try:
+        try:
+            statement = next(plan)
+            while True:
+                statement = plan.send(session.execute(statement))
+        except StopIteration as stop:
+            rows = stop.value
+        start = time.perf_counter()
+        session.commit()
+        if metrics is not None:
+            metrics.record(name + ".commit", time.perf_counter() - start)
+        return rows
+    except Exception as err:
+        session.rollback()
+        if metrics is not None:
+            metrics.increment(name + ".rollback")
+            kind = lock_error(err)
+            if kind:
+                metrics.increment(name + "." + kind)
+        raise
+
+
+async def run_plan_async(session, plan, metrics=None, name=None):
+    """
+    Drive a plan on an AsyncSession in one transaction, the asyncio counterpart of run_plan
+    :params session, plan, metrics to record commit latency and rollbacks under the operation name
+    :return the rows the plan touched
+    """
+    try:
+        try:
+            statement = next(plan)
+            while True:
+                statement = plan.send(await session.execute(statement))
+        except StopIteration as stop:
+            rows = stop.value
+        start = time.perf_counter()
+        await session.commit()
+        if metrics is not None:
+            metrics.record(name + ".commit", time.perf_counter() - start)
+        return rows
+    except Exception as err:
+        await session.rollback()
+        if metrics is not None:
+            metrics.increment(name + ".rollback")
+            kind = lock_error(err)
+            if kind:
+                metrics.increment(name + "." + kind)
+        raise
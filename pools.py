@@ -0,0 +1,104 @@
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, NullPool, StaticPool, SingletonThreadPool
+
+POOLS = {
+    "queue": QueuePool,
+    "null": NullPool,
+    "static": StaticPool,
+    "singleton": SingletonThreadPool,
+}
+
+
+def pool_options(config):
+    """
+    The create_engine pool arguments from the configuration
+    :params Config with the POOL_* settings, unset values keep the dialect defaults
+    :return dict of keyword arguments
+    """
+    options = {}
+    sized = any(value is not None for value in (config.POOL_SIZE, config.POOL_MAX_OVERFLOW, config.POOL_TIMEOUT))
+    # the sizing arguments only apply to a QueuePool, the sqlite default is a NullPool
+    name = config.POOL_CLASS or ("queue" if sized else None)
+    if name:
+        try:
+            options["poolclass"] = POOLS[name]
+        except KeyError:
+            raise ValueError("Unknown pool class: {}".format(name))
+    if config.POOL_SIZE is not None:
+        options["pool_size"] = config.POOL_SIZE
+    if config.POOL_MAX_OVERFLOW is not None:
+        options["max_overflow"] = config.POOL_MAX_OVERFLOW
+    if config.POOL_TIMEOUT is not None:
+        options["pool_timeout"] = config.POOL_TIMEOUT
+    if config.POOL_RECYCLE is not None:
+        options["pool_recycle"] = config.POOL_RECYCLE
+    if config.POOL_PRE_PING:
+        options["pool_pre_ping"] = True
+    return options
+
+
+class TimedPool(object):
+    """ Mixed into the engine's pool class to time how long each checkout waits for a connection """
+    monitor = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        error = False
+        try:
+            return super(TimedPool, self)._do_get()
+        except exc.TimeoutError:
+            error = True
+            self.monitor.metrics.increment("pool.timeout")
+            raise
+        finally:
+            self.monitor.metrics.record("pool.checkout", time.perf_counter() - start, error)
+
+
+def timed_pool_class(base, monitor):
+    # a class per engine, since dispose recreates the pool from its class
+    return type("Timed" + base.__name__, (TimedPool, base), {"monitor": monitor})
+
+
+class PoolMonitor(object):
+    """
+    Instrument engine pools into metrics: checkout wait, connections in use, overflow and churn
+    :params metrics, shared by every engine the monitor is attached to
+    :return pool.* histograms, counters and gauges
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, "connect", self.connect)
+        event.listen(engine, "close", self.close)
+        event.listen(engine, "invalidate", self.invalidate)
+        event.listen(engine, "checkout", lambda conn, record, proxy: self.checkout(engine.pool))
+        event.listen(engine, "checkin", self.checkin)
+
+    def connect(self, dbapi_connection, connection_record):
+        self.metrics.increment("pool.connect")
+
+    def close(self, dbapi_connection, connection_record):
+        self.metrics.increment("pool.close")
+
+    def invalidate(self, dbapi_connection, connection_record, exception):
+        self.metrics.increment("pool.invalidate")
+
+    def checkout(self, pool):
+        with self.lock:
+            self.in_use += 1
+            in_use = self.in_use
+        self.metrics.gauge("pool.in_use", in_use)
+        if isinstance(pool, QueuePool):
+            self.metrics.gauge("pool.overflow", max(0, pool.overflow()))
+
+    def checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.in_use -= 1
+            in_use = self.in_use
+        self.metrics.gauge("pool.in_use", in_use)
@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from database import Base, db_session
+
+logger = logging.getLogger("TASKS.POPULATE")
+
+
+def dependencies(table_names=None):
+    """
+    The parent tables of each table, from the foreign keys of the schema metadata
+    :params table names to restrict the graph to, all tables by default
+    :return dict of table name to the set of table names it references
+    """
+    import models
+    tables = [t for t in Base.metadata.sorted_tables if table_names is None or t.name in table_names]
+    names = {t.name for t in tables}
+    graph = {}
+    for table in tables:
+        graph[table.name] = {fk.column.table.name for fk in table.foreign_keys
+                             if fk.column.table.name in names and fk.column.table.name != table.name}
+    return graph
+
+
+def run_graph(tasks, workers=1):
+    """
+    Run a task per table as soon as the tables it references are loaded, independent tables concurrently
+    :params dict of table name to a callable, most tasks running at once
+    :return dict of table name to {"result", "start", "seconds"}, starts relative to the first task
+    """
+    graph = dependencies(tasks)
+    missing = set(tasks) - set(graph)
+    if missing:
+        raise ValueError("Not tables of the schema: {}".format(", ".join(sorted(missing))))
+    # in metadata order, so one worker loads the tables in the same order every time
+    order = list(graph)
+    done = {}
+    lock = threading.Lock()
+    origin = time.perf_counter()
+
+    def run(name):
+        start = time.perf_counter()
+        try:
+            result = tasks[name]()
+        finally:
+            # every thread loads through its own scoped session and connection, hand it back
+            db_session.remove()
+        with lock:
+            done[name] = {"result": result, "start": start - origin, "seconds": time.perf_counter() - start}
+        return name
+
+    pending = set()
+    submitted = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="populate") as executor:
+        while len(submitted) < len(order) or pending:
+            for name in order:
+                if name not in submitted and graph[name] <= set(done):
+                    submitted.add(name)
+                    pending.add(executor.submit(run, name))
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                # raise a failed table's error, its dependents could never run
+                logger.info("{} loaded".format(future.result()))
+    return done
+
+
+def critical_path(timings):
+    """ The longest chain of dependent table loads, in seconds, the floor on the population wall time """
+    graph = dependencies(timings)
+    finish = {}
+    for name in graph:
+        finish[name] = timings[name]["seconds"] + max([finish[parent] for parent in graph[name]] or [0.0])
+    return max(finish.values() or [0.0])
+
+
+def report(timings, wall):
+    """ Return the per table load windows, the wall time and the critical path as report lines """
+    lines = ["{:<16} {:>9} {:>9}".format("table", "start", "seconds")]
+    for name, timing in sorted(timings.items(), key=lambda item: item[1]["start"]):
+        lines.append("{:<16} {:>9.3f} {:>9.3f}".format(name, timing["start"], timing["seconds"]))
+    total = sum(timing["seconds"] for timing in timings.values())
+    lines.append("Populated in {:.3f}s, critical path {:.3f}s, {:.3f}s of table loads".format(
+        wall, critical_path(timings), total))
+    return lines
@@ -0,0 +1,124 @@
+import os
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger("MAIN.PRAGMAS")
+
+# page_size only takes effect on a new database, so it is set first
+ORDER = ("page_size", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")
+
+PROFILES = {
+    # the sqlite3 defaults, rollback journal and full synchronous commits
+    "default": {},
+    "delete_normal": {"journal_mode": "DELETE", "synchronous": "NORMAL"},
+    "wal": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "wal_normal": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+    "wal_cached": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536,
+                   "mmap_size": 268435456, "temp_store": "MEMORY"},
+    "wal_16k": {"page_size": 16384, "journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536,
+                "mmap_size": 268435456, "temp_store": "MEMORY"},
+    # no durability at all, the upper bound
+    "unsafe": {"journal_mode": "MEMORY", "synchronous": "OFF", "cache_size": -65536, "temp_store": "MEMORY"},
+}
+
+
+def parse(text):
+    """
+    A named profile or pragma settings
+    :params profile name, or comma separated pragma=value pairs, i.e. journal_mode=WAL,synchronous=NORMAL
+    :return dict of pragma name to value
+    """
+    if "=" not in text:
+        try:
+            return dict(PROFILES[text])
+        except KeyError:
+            raise ValueError("Unknown pragma profile: {}".format(text))
+    settings = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip().lower()
+        if name not in ORDER:
+            raise ValueError("Unsupported pragma: {}".format(name))
+        settings[name] = value.strip()
+    return settings
+
+
+def attach(engine, settings):
+    """ Apply the pragmas to every connection the engine opens """
+    statements = ["PRAGMA {}={}".format(name, settings[name]) for name in ORDER if name in settings]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def effective(engine):
+    """ The values the database reports for the pragmas, to confirm a profile took """
+    values = {}
+    with engine.connect() as connection:
+        for name in ORDER:
+            values[name] = connection.exec_driver_sql("PRAGMA {}".format(name)).scalar()
+    return values
+
+
+def remove_database(uri):
+    """ Delete a SQLite database file with its journal, so the next profile starts from a new file """
+    url = make_url(uri)
+    if url.get_backend_name() != "sqlite":
+        raise ValueError("Pragma profiles are for SQLite databases, not: {}".format(url.get_backend_name()))
+    if not url.database or url.database == ":memory:":
+        return
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(url.database + suffix):
+            os.remove(url.database + suffix)
+
+
+def compare(results):
+    """
+    Compare the runs of the pragma profiles against the first one
+    :params ordered dict of profile name to {"metrics": Metrics, "load": per table load stats, "seconds": seeding}
+    :return report lines, throughput, latency and seeding deltas in percent
+    """
+    names = list(results)
+    baseline = results[names[0]]
+    base_summary = baseline["metrics"].summary()
+    lines = ["Pragma profiles compared against {}".format(names[0])]
+
+    lines.append("{:<16} {:>10} {:>9} {:>12} {:>9}".format("profile", "seed secs", "delta", "rows/sec", "delta"))
+    for name in names:
+        rows = sum(stats["rows"] for stats in results[name]["load"].values())
+        base_rows = sum(stats["rows"] for stats in baseline["load"].values())
+        lines.append("{:<16} {:>10.3f} {:>+8.1f}% {:>12.0f} {:>+8.1f}%".format(
+            name, results[name]["seconds"], delta(results[name]["seconds"], baseline["seconds"]),
+            rate(rows, results[name]["seconds"]),
+            delta(rate(rows, results[name]["seconds"]), rate(base_rows, baseline["seconds"]))))
+
+    lines.append("{:<36} {:<16} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "operation", "profile", "ops/sec", "delta", "p50", "delta", "p99", "delta"))
+    for operation, base in base_summary.items():
+        if operation.startswith(("load.", "pool.", "snapshot.")):
+            continue
+        for name in names:
+            s = results[name]["metrics"].summary().get(operation)
+            if s is None:
+                continue
+            lines.append("{:<36} {:<16} {:>9.1f} {:>+8.1f}% {:>9.3f} {:>+8.1f}% {:>9.3f} {:>+8.1f}%".format(
+                operation, name, s["throughput"], delta(s["throughput"], base["throughput"]),
+                s["p50"] * 1000, delta(s["p50"], base["p50"]), s["p99"] * 1000, delta(s["p99"], base["p99"])))
+    return lines
+
+
+def rate(rows, seconds):
+    return rows / seconds if seconds else 0.0
+
+
+def delta(value, base):
+    return (value - base) / base * 100.0 if base else 0.0
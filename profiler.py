@@ -0,0 +1,150 @@
+import re
+import time
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+WHITESPACE = re.compile(r"\s+")
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize(statement):
+    """ Collapse literals, IN lists and whitespace so equivalent statements aggregate together """
+    statement = STRINGS.sub("?", statement)
+    statement = NUMBERS.sub("?", statement)
+    statement = statement.replace("%s", "?")
+    statement = IN_LISTS.sub("(...)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+class CountingCursor(object):
+    """ A DBAPI cursor counting the rows fetched through it into its statement's profile """
+
+    def __init__(self, cursor, profiler, statement):
+        self.cursor = cursor
+        self.profiler = profiler
+        self.statement = statement
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.profiler.add_rows(self.statement, 1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.profiler.add_rows(self.statement, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.profiler.add_rows(self.statement, len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class StatementProfiler(object):
+    """
+    Aggregate executed SQL by normalized statement from the engine cursor events
+    :params engine, or every engine when none is given
+    :return per statement count, total, mean and max time, and rows returned or affected
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.target = None
+
+    @property
+    def enabled(self):
+        return self.target is not None
+
+    def enable(self, target=Engine):
+        if self.target is None:
+            event.listen(target, "before_cursor_execute", self.before_cursor_execute)
+            event.listen(target, "after_cursor_execute", self.after_cursor_execute)
+            event.listen(target, "handle_error", self.handle_error)
+            self.target = target
+
+    def disable(self):
+        if self.target is not None:
+            event.remove(self.target, "before_cursor_execute", self.before_cursor_execute)
+            event.remove(self.target, "after_cursor_execute", self.after_cursor_execute)
+            event.remove(self.target, "handle_error", self.handle_error)
+            self.target = None
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = getattr(self.local, "starts", None)
+        if starts is None:
+            starts = self.local.starts = []
+        starts.append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - self.local.starts.pop()
+        statement = normalize(statement)
+        if cursor.description is not None and context is not None:
+            # drivers report -1 as the rowcount of selects, i.e. sqlite, so count the rows as they are fetched
+            self.record(statement, elapsed)
+            context.cursor = CountingCursor(cursor, self, statement)
+        else:
+            rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+            self.record(statement, elapsed, rows)
+
+    def handle_error(self, exception_context):
+        # a failed statement never reaches after_cursor_execute
+        starts = getattr(self.local, "starts", None)
+        if starts and exception_context.cursor is not None:
+            starts.pop()
+
+    def record(self, statement, seconds, rows=0, count=1, max_seconds=None):
+        with self.lock:
+            entry = self.stats.get(statement)
+            if entry is None:
+                entry = self.stats[statement] = {"count": 0, "total": 0.0, "max": 0.0, "rows": 0}
+            entry["count"] += count
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds if max_seconds is None else max_seconds)
+            entry["rows"] += rows
+
+    def add_rows(self, statement, rows):
+        with self.lock:
+            entry = self.stats.get(statement)
+            if entry is not None:
+                entry["rows"] += rows
+
+    def merge(self, data):
+        for statement, entry in data.items():
+            self.record(statement, entry["total"], entry["rows"], entry["count"], entry["max"])
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def to_dict(self):
+        with self.lock:
+            return {statement: dict(entry) for statement, entry in self.stats.items()}
+
+    def top(self, n=10, key="total"):
+        """ The n statements with the highest total, mean or max time """
+        stats = self.to_dict()
+        for entry in stats.values():
+            entry["mean"] = entry["total"] / entry["count"]
+        return sorted(stats.items(), key=lambda item: item[1][key], reverse=True)[:n]
+
+    def report(self, n=10, key="total", width=100):
+        """ Return the top n statements as table lines, times in milliseconds """
+        lines = ["{:>8} {:>11} {:>9} {:>9} {:>9}  {}".format("count", "total", "mean", "max", "rows", "statement")]
+        for statement, entry in self.top(n, key):
+            lines.append("{:>8} {:>11.3f} {:>9.3f} {:>9.3f} {:>9}  {}".format(
+                entry["count"], entry["total"] * 1000, entry["mean"] * 1000, entry["max"] * 1000,
+                entry["rows"], statement[:width]))
+        return lines
+
+
+# the process wide profiler, attached to every engine when enabled
+registry = StatementProfiler()
@@ -0,0 +1,156 @@
+import time
+import random
+import logging
+import threading
+import database
+from metrics import Metrics
+from pools import PoolMonitor
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger("MAIN.SCHEDULER")
+
+ARRIVALS = ("constant", "poisson")
+
+
+def parse_stages(text):
+    """
+    Parse a stage list, i.e. "10:30,50:30,100:60"
+    :params comma separated qps:seconds pairs
+    :return list of (qps, seconds) tuples
+    """
+    stages = []
+    for part in text.split(","):
+        qps, seconds = part.split(":")
+        stages.append((float(qps), float(seconds)))
+    return stages
+
+
+def arrival_offsets(stages, arrival="constant", rng=None):
+    """ Yield the intended start offset, in seconds from the start of the run, of every operation """
+    if arrival not in ARRIVALS:
+        raise ValueError("Unknown arrival process: {}".format(arrival))
+    rng = rng or random.Random()
+    stage_start = 0.0
+
+    for qps, seconds in stages:
+        stage_end = stage_start + seconds
+        if qps <= 0:
+            stage_start = stage_end
+            continue
+        t = stage_start
+        while True:
+            t += rng.expovariate(qps) if arrival == "poisson" else 1.0 / qps
+            if t >= stage_end:
+                break
+            yield t
+        stage_start = stage_end
+
+
+class OpenLoopScheduler(object):
+    """
+    Issue workload operations at a target rate regardless of how long they take
+    :params workload_class, stages of (qps, seconds), arrival process, pool size
+    :return stats dict
+    """
+
+    def __init__(self, workload_class, stages, arrival="constant", workers=8, seed=None, options=None):
+        self.workload_class = workload_class
+        self.stages = stages
+        self.arrival = arrival
+        self.workers = workers
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.options = options or {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.engines = []
+        # errors are database errors of completed operations, failed the operations that raised anything else
+        self.stats = {"scheduled": 0, "completed": 0, "errors": 0, "failed": 0}
+        # latency from the intended start per operation, and the schedule lag
+        self.metrics = Metrics()
+        # service time per operation, recorded by the workloads themselves
+        self.service = Metrics()
+        # the live view shows the latency from the intended start, not the service time
+        self.service.tap = None
+        self.monitor = PoolMonitor(self.metrics)
+
+    def workload(self):
+        """ The calling thread's workload, each pool thread owns its own engine and session """
+        workload = getattr(self.local, "workload", None)
+        if workload is None:
+            engine = database.make_engine(monitor=self.monitor)
+            with self.lock:
+                self.engines.append(engine)
+                index = len(self.engines)
+            # the arrivals draw from the seed itself, each thread's mix from the seed offset by its index
+            seed = self.seed + index if self.seed is not None else None
+            workload = self.workload_class(db=database.make_session(engine), metrics=self.service, seed=seed,
+                                           **self.options)
+            self.local.workload = workload
+        return workload
+
+    def execute(self, intended):
+        """ Run one operation, latency is measured from the intended start to avoid coordinated omission """
+        started = time.perf_counter()
+        workload = self.workload()
+        name = workload.next_operation()
+        error = False
+        try:
+            workload.run_operation(name)
+        except SQLAlchemyError as db_err:
+            workload.db.rollback()
+            error = True
+            logger.warning("Operation {} failed: {}".format(name, str(db_err)))
+        finally:
+            # release the connection on this thread, like a request scoped session
+            workload.db.close()
+        finished = time.perf_counter()
+
+        self.metrics.record("schedule_lag", started - intended)
+        self.metrics.record(name, finished - intended, error)
+        with self.lock:
+            self.stats["completed"] += 1
+            self.stats["errors"] += int(error)
+
+    def done(self, future):
+        """ Count and log an operation that raised, the executor would otherwise drop its exception """
+        error = future.exception()
+        if error is not None:
+            with self.lock:
+                self.stats["failed"] += 1
+            logger.error("Scheduled operation failed: {!r}".format(error))
+
+    def run(self):
+        """ Dispatch operations on schedule until every stage has elapsed """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        start = time.perf_counter()
+
+        try:
+            for offset in arrival_offsets(self.stages, self.arrival, self.rng):
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.execute, intended).add_done_callback(self.done)
+                self.stats["scheduled"] += 1
+        finally:
+            executor.shutdown(wait=True)
+            for engine in self.engines:
+                engine.dispose()
+
+        self.stats["seconds"] = time.perf_counter() - start
+        return self.stats
+
+
+def report(stats, metrics):
+    """ Return the scheduler summary lines """
+    seconds = stats["seconds"] or 1.0
+    lag = metrics.summary().get("schedule_lag", {"mean": 0.0, "p99": 0.0, "max": 0.0})
+    return [
+        "{} operations scheduled, {} completed, {} errors, {} failed in {:.3f}s ({:.1f} ops/sec achieved)".format(
+            str(stats["scheduled"]), str(stats["completed"]), str(stats["errors"]), str(stats["failed"]),
+            stats["seconds"], stats["completed"] / seconds),
+        "Schedule lag: mean {:.3f}ms, p99 {:.3f}ms, max {:.3f}ms".format(
+            lag["mean"] * 1000, lag["p99"] * 1000, lag["max"] * 1000),
+    ]
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import logging
+from database import Base
+from sqlalchemy import text
+
+logger = logging.getLogger("MAIN.SNAPSHOT")
+
+# prefix of the shadow tables holding the snapshot on server databases
+SHADOW_PREFIX = "snapshot_"
+
+
+class SQLiteSnapshot(object):
+    """
+    Capture a SQLite database with the backup API and copy it back
+    :params engine, snapshot file, the database file + ".snapshot" by default
+    :return None
+    """
+
+    def __init__(self, engine, path=None):
+        self.engine = engine
+        database = engine.url.database
+        self.memory = not database or database == ":memory:"
+        self.path = path or (None if self.memory else database + ".snapshot")
+        self.copy = None
+
+    def take(self):
+        target = sqlite3.connect(":memory:" if self.memory else self.path)
+        self.backup(self.engine, target, to_engine=False)
+        if self.memory:
+            self.copy = target
+        else:
+            target.close()
+
+    def restore(self):
+        source = self.copy if self.memory else sqlite3.connect(self.path)
+        self.backup(self.engine, source, to_engine=True)
+        if not self.memory:
+            source.close()
+
+    @staticmethod
+    def backup(engine, other, to_engine):
+        connection = engine.raw_connection()
+        try:
+            if to_engine:
+                other.backup(connection.connection)
+            else:
+                connection.connection.backup(other)
+        finally:
+            connection.close()
+
+    def drop(self):
+        if self.copy is not None:
+            self.copy.close()
+            self.copy = None
+        elif self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class TableSnapshot(object):
+    """
+    Copy every table into a shadow table and reload from it, i.e. on MySQL
+    :params engine
+    :return None
+    """
+
+    def __init__(self, engine, path=None):
+        self.engine = engine
+        self.mysql = engine.dialect.name == "mysql"
+
+    def take(self):
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                shadow = SHADOW_PREFIX + table.name
+                conn.execute(text("DROP TABLE IF EXISTS {}".format(shadow)))
+                if self.mysql:
+                    conn.execute(text("CREATE TABLE {} LIKE {}".format(shadow, table.name)))
+                    conn.execute(text("INSERT INTO {} SELECT * FROM {}".format(shadow, table.name)))
+                else:
+                    conn.execute(text("CREATE TABLE {} AS SELECT * FROM {}".format(shadow, table.name)))
+
+    def restore(self):
+        with self.engine.begin() as conn:
+            if self.mysql:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+            for table in reversed(Base.metadata.sorted_tables):
+                # truncate is a drop and create on MySQL, far faster than deleting the rows
+                conn.execute(text(("TRUNCATE TABLE {}" if self.mysql else "DELETE FROM {}").format(table.name)))
+            for table in Base.metadata.sorted_tables:
+                conn.execute(text("INSERT INTO {} SELECT * FROM {}".format(table.name, SHADOW_PREFIX + table.name)))
+            if self.mysql:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+
+    def drop(self):
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                conn.execute(text("DROP TABLE IF EXISTS {}".format(SHADOW_PREFIX + table.name)))
+
+
+def make_snapshot(engine, path=None):
+    """ The snapshot strategy for the engine's database """
+    if engine.dialect.name == "sqlite":
+        return SQLiteSnapshot(engine, path)
+    return TableSnapshot(engine, path)
@@ -0,0 +1,133 @@
+import os
+import json
+import logging
+import config
+import requests
+
+logger = logging.getLogger("TASKS.SOURCES")
+cfg = config.Config()
+
+
+class DataSource(object):
+    """
+    A source of seed records for the table loaders
+    :params name of the record set, i.e. dealer, customer_order
+    :return iterable of dicts
+    """
+
+    def records(self, name):
+        raise NotImplementedError
+
+
+class MockarooSource(DataSource):
+    """ Seed records from the Mockaroo API """
+
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = base_url or cfg.BASE_URL
+        self.api_key = api_key or cfg.API_KEY
+
+    def records(self, name):
+        hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
+        r = requests.request(
+            "GET",
+            self.base_url + name + ".json" + self.api_key,
+            headers=hdr,
+            params=None
+        )
+        if r.status_code != 200:
+            logger.warning("API status code: {}".format(str(r.status_code)))
+            return []
+        return r.json()
+
+
+class LocalFileSource(DataSource):
+    """ Seed records streamed from the bundled data/*.json fixtures """
+
+    FILES = {
+        "dealer": "dealers.json",
+        "customer": "customers2.json",
+        "customer_address": "customer_address.json",
+        "dealer_location": "dealer_locations.json",
+        "dealer_product_type": "product_types.json",
+        "dealer_products": "products.json",
+        "customer_order": "orders.json",
+        "customer_order_detail": "order_details.json",
+        "customer_order_shipping": "order_shipping.json",
+    }
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or cfg.DATA_DIR
+
+    def records(self, name):
+        path = os.path.join(self.data_dir, self.FILES[name])
+        return iter_json_array(path)
+
+
+SOURCES = {
+    "mockaroo": MockarooSource,
+    "local": LocalFileSource,
+}
+
+
+def get_source(name=None):
+    """ Return a data source instance by name, defaults to Config.DATA_SOURCE """
+    name = name or cfg.DATA_SOURCE
+    try:
+        return SOURCES[name]()
+    except KeyError:
+        raise ValueError("Unknown data source: {}".format(name))
+
+
+def iter_json_array(path, chunk_size=64 * 1024):
+    """ Yield the items of a top level JSON array one at a time without loading the whole file """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            # skip whitespace and item separators, reading more as needed
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buf = buf[pos:] + chunk
+                pos = 0
+
+            if pos >= len(buf):
+                return
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("{} does not contain a JSON array".format(path))
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                item, end = None, len(buf)
+
+            # the item may have been cut off at the end of the buffer
+            if end >= len(buf) and not eof:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+            yield item
+            pos = end
@@ -1,12 +1,19 @@
 import os
 import sys
+import time
 import logging
 import random
+import itertools
+import threading
 import config
 import requests
 import logging
 from datetime import datetime, timedelta
 from database import db_session as db
+from sources import get_source
+from mix import lock_error
+from metrics import registry
+from idpool import registry as id_pools
 from models import Dealer, Customer, Address, Location, ProductType, Product, CustomerOrder, \
     OrderDetail, OrderShipping
 from sqlalchemy.exc import SQLAlchemyError
@@ -19,438 +26,386 @@ formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 cfg = config.Config()
+load_stats = {}
+load_stats_lock = threading.Lock()
 
 
-def get_dealers():
-    """ Generate Mock Data from API Endpoint """
-    API_PATH = "dealer.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def bulk_insert(model, rows, batch_size=None):
+    """ Insert an iterable of row mappings with executemany, one transaction per batch """
+    table = model.__table__
+    batch_size = batch_size or cfg.BATCH_SIZE
+    batch = []
+    cnt = 0
+    failed = 0
+    start = time.perf_counter()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            inserted = insert_batch(table, batch)
+            cnt += inserted
+            failed += not inserted
+            batch = []
+    if batch:
+        inserted = insert_batch(table, batch)
+        cnt += inserted
+        failed += not inserted
+
+    record_load(table.name, cnt, time.perf_counter() - start, failed)
+    return cnt
+
+
+def insert_batch(table, batch, retries=None):
+    """ Write a single batch of rows and commit it, retried with backoff while the database is locked """
+    retries = cfg.LOAD_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            db.execute(table.insert(), batch)
+            db.commit()
+            registry.record("load." + table.name, time.perf_counter() - start)
+            logger.info("{} Batch Inserted: {} rows".format(table.name, str(len(batch))))
+            return len(batch)
+        except SQLAlchemyError as db_err:
+            db.rollback()
+            registry.record("load." + table.name, time.perf_counter() - start, error=True)
+            # concurrent loaders of independent tables contend for sqlite's single writer
+            if attempt < retries and lock_error(db_err):
+                registry.increment("load." + table.name + ".retry")
+                logger.warning("{} Batch Retried: {}".format(table.name, str(db_err)))
+                time.sleep(0.05 * 2 ** attempt * (1 + random.random()))
+                continue
+            logger.critical("Database Error: {}".format(str(db_err)))
+            return 0
+
+
+def record_load(table_name, rows, seconds, failed=0):
+    """ Accumulate the rows loaded, time spent and batches failed per table """
+    with load_stats_lock:
+        stats = load_stats.setdefault(table_name, {"rows": 0, "seconds": 0.0, "failed": 0})
+        stats["rows"] += rows
+        stats["seconds"] += seconds
+        stats["failed"] += failed
+
+
+def failed_batches():
+    """ The number of batches that failed to load per table, the tables without failures left out """
+    with load_stats_lock:
+        return {table_name: stats["failed"] for table_name, stats in load_stats.items() if stats["failed"]}
+
+
+def reset_load_stats():
+    with load_stats_lock:
+        load_stats.clear()
+
+
+def load_report():
+    """ Return the per table rows/sec report lines """
+    lines = []
+    with load_stats_lock:
+        for table_name, stats in load_stats.items():
+            rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+            lines.append("{}: {} rows in {:.3f}s ({:.0f} rows/sec){}".format(
+                table_name, str(stats["rows"]), stats["seconds"], rate,
+                ", {} batches failed".format(str(stats["failed"])) if stats["failed"] else ""))
+    return lines
+
+
+def get_dealers(batch_size=None, source=None):
+    """ Generate Mock Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        rows = (
+            {"name": i["name"], "dealer_code": i["dealer_code"]}
+            for i in source.records("dealer")
         )
-        # logger.info("{}{}{}".format(cfg.BASE_URL, API_PATH, cfg.API_KEY))
-        if r.status_code == 200:
-            resp = r.json()
-            for i in resp:
-                dealer = Dealer(
-                    name=i["name"],
-                    dealer_code=i["dealer_code"],
-                )
-                # save to database
-                db.add(dealer)
-                db.commit()
-                db.flush()
-                cnt += 1
-                logger.info("Dealer Record Added: {}:{}".format(str(dealer.id), i["name"]))
-
-            # log the total records added
-            logger.info("Total Records Processed: {}".format(str(cnt)))
+        # save to database
+        cnt = bulk_insert(Dealer, rows, batch_size)
 
-        else:
-            logger.info("MockAPI returned status code: {}".format(str(r.status_code)))
+        # log the total records added
+        logger.info("Total Records Processed: {}".format(str(cnt)))
 
-    except requests.exceptions.HTTPError as http_err:
+    except requests.exceptions.RequestException as http_err:
         logger.info("HTTP Error: {}".format(str(http_err)))
 
     return cnt
 
 
-def get_dealer_customers():
+def get_dealer_customers(batch_size=None, source=None):
     """ Populate the Dealer Customer List """
-    API_PATH = "customer.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        dealer_ids = id_pools.get(db, Dealer, limit=cfg.QUERY_LIMIT)
+        if not dealer_ids:
+            logger.warning("No Dealer Records, skipping Customers")
+            return "{} Customers Loaded".format(str(cnt))
+
+        rows = (
+            {
+                "dealer_id": dealer_ids.pick(),
+                "first_name": r["first_name"],
+                "last_name": r["last_name"],
+                "email": r["email"],
+                "status": True
+            }
+            for r in source.records("customer")
         )
 
-        if r.status_code == 200:
-            resp = r.json()
-            dealers = db.query(Dealer).limit(cfg.QUERY_LIMIT).all()
-            dealer_ids = [dealer.id for dealer in dealers]
-            for r in resp:
-                nc = Customer(
-                    dealer_id=random.choice(dealer_ids),
-                    first_name=r["first_name"],
-                    last_name=r["last_name"],
-                    email=r["email"],
-                    status=True
-                )
-
-                # save to database
-                try:
-                    db.add(nc)
-                    db.commit()
-                    db.flush()
-                    cnt += 1
-                    logger.info("Customer Added:{}: {} {}".format(str(nc.id), r["first_name"], r["last_name"]))
-
-                except SQLAlchemyError as db_err:
-                    logger.critical("Database Error: {}".format(str(db_err)))
-
-            # log totals
-            logger.info("{} Total Customers Created".format(str(cnt)))
+        # save to database
+        cnt = bulk_insert(Customer, rows, batch_size)
 
-        else:
-            logger.warning("API status code: {}".format(str(r.status_code)))
+        # log totals
+        logger.info("{} Total Customers Created".format(str(cnt)))
 
-    except requests.exceptions.HTTPError as err:
+    except requests.exceptions.RequestException as err:
         logger.critical("HTTP Connection Error: {}".format(str(err)))
 
     return "{} Customers Loaded".format(str(cnt))
 
 
-def get_dealer_customer_addresses():
-    """ Generate Mock Customer Address Data from API Endpoint """
-    API_PATH = "customer_address.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def get_dealer_customer_addresses(batch_size=None, source=None):
+    """ Generate Mock Customer Address Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        customer_ids = id_pools.get(db, Customer, limit=cfg.QUERY_LIMIT)
+        if not customer_ids:
+            logger.warning("No Customer Records, skipping Customer Addresses")
+            return
+
+        rows = (
+            {
+                "customer_id": customer_ids.pick(),
+                "street": addr["street"],
+                "city": addr["city"],
+                "state": addr["state"],
+                "zip_code": addr["zip_code"],
+                "latitude": addr["latitude"],
+                "longitude": addr["longitude"],
+                "status": True
+            }
+            for addr in source.records("customer_address")
         )
-        # logger.info("{}{}{}".format(cfg.BASE_URL, API_PATH, cfg.API_KEY))
-        if r.status_code == 200:
-            resp = r.json()
-            customers = db.query(Customer).limit(cfg.QUERY_LIMIT).all()
-            customer_ids = [c.id for c in customers]
-            for addr in resp:
-                nca = Address(
-                    customer_id=random.choice(customer_ids),
-                    street=addr["street"],
-                    city=addr["city"],
-                    state=addr["state"],
-                    zip_code=addr["zip_code"],
-                    latitude=addr["latitude"],
-                    longitude=addr["longitude"],
-                    status=True
-                )
-                # save to the database
-                try:
-                    db.add(nca)
-                    db.commit()
-                    db.flush()
-                    logger.info("Customer {} Address Added: {} {}".format(str(nca.id), str(addr["latitude"]), str(addr["longitude"])))
-                    cnt += 1
-                except SQLAlchemyError as db_err:
-                    logger.critical("Database Error: {}".format(str(db_err)))
-
-            # log the totals
-            logger.info("{} Total Customer Address Records Created".format(str(cnt)))
+        # save to the database
+        cnt = bulk_insert(Address, rows, batch_size)
 
-        else:
-            logger.warning("API status code: {}".format(str(r.status_code)))
+        # log the totals
+        logger.info("{} Total Customer Address Records Created".format(str(cnt)))
 
-    except requests.exceptions.HTTPError as err:
+    except requests.exceptions.RequestException as err:
         logger.warning("HTTP Connection Error: {}".format(str(err)))
 
 
-def get_dealer_locations():
-    """ Get the Dealer Location Mock Data from API Endpoint"""
-    API_PATH = "dealer_location.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def get_dealer_locations(batch_size=None, source=None):
+    """ Get the Dealer Location Mock Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        dealer_ids = id_pools.get(db, Dealer, limit=cfg.QUERY_LIMIT)
+        if not dealer_ids:
+            logger.warning("No Dealer Records, skipping Dealer Locations")
+            return cnt
+
+        rows = (
+            {
+                "dealer_id": dealer_ids.pick(),
+                "address": loc["address"],
+                "active": True
+            }
+            for loc in source.records("dealer_location")
         )
 
-        if r.status_code == 200:
-            resp = r.json()
-            dealers = db.query(Dealer).limit(cfg.QUERY_LIMIT).all()
-            dealer_ids = [d.id for d in dealers]
-
-            for loc in resp:
-                location = Location(
-                    dealer_id=random.choice(dealer_ids),
-                    address=loc["address"],
-                    active=True
-                )
-
-                db.add(location)
-                db.commit()
-                db.flush()
-                cnt += 1
-                logger.info("Dealer ID: {} Location Addded: {}".format(str(location.id), loc["address"]))
-            logger.info("{} Total Dealer Locations Addedd".format(str(cnt)))
-        else:
-            logger.warning("API status code: {}".format(str(r.status_code)))
+        cnt = bulk_insert(Location, rows, batch_size)
+        logger.info("{} Total Dealer Locations Addedd".format(str(cnt)))
 
-    except requests.exceptions.HTTPError as e:
+    except requests.exceptions.RequestException as e:
         logger.info(e)
 
     return cnt
 
 
-def get_dealer_product_types():
-    """ Get Dealer Product Types Mock Data from API Endpoint """
-    API_PATH = "dealer_product_type.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def get_dealer_product_types(batch_size=None, source=None):
+    """ Get Dealer Product Types Mock Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        dealer_ids = id_pools.get(db, Dealer, limit=cfg.QUERY_LIMIT)
+        if not dealer_ids:
+            logger.warning("No Dealer Records, skipping Product Types")
+            return cnt
+
+        rows = (
+            {
+                "dealer_id": dealer_ids.pick(),
+                "name": p["name"],
+                "active": True
+            }
+            for p in source.records("dealer_product_type")
         )
+        # save to the database
+        cnt = bulk_insert(ProductType, rows, batch_size)
+        logger.info("{} Total Product Types Created".format(str(cnt)))
 
-        if r.status_code == 200:
-            resp = r.json()
-            dealers = db.query(Dealer).limit(cfg.QUERY_LIMIT).all()
-            dealer_ids = [d.id for d in dealers]
-
-            for p in resp:
-                dpt = ProductType(
-                    dealer_id=random.choice(dealer_ids),
-                    name=p["name"],
-                    active=True
-                )
-                # save to the database
-                try:
-                    db.add(dpt)
-                    db.commit()
-                    db.flush()
-                    cnt += 1
-                    logger.info("Product Type ID: {} Addded".format(str(dpt.id)))
-
-                except SQLAlchemyError as err:
-                    logger.critical("Database Error: {}".format(str(err)))
-            logger.info("{} Total Product Types Created".format(str(cnt)))
-        else:
-            logger.warning("API status code: {}".format(str(r.status_code)))
-
-    except requests.exceptions.HTTPError as e:
+    except requests.exceptions.RequestException as e:
         logger.warning("HTTP Connection Error: {}".format(str(e)))
 
     return cnt
 
 
-def get_dealer_products():
-    """ Get Dealer Product Mock Data from API Endpoint """
-    API_PATH = "dealer_products.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def get_dealer_products(batch_size=None, source=None):
+    """ Get Dealer Product Mock Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        ids = id_pools.get(db, Dealer, limit=cfg.QUERY_LIMIT)
+        pids = id_pools.get(db, ProductType)
+        if not ids or not pids:
+            logger.warning("No Dealer or Product Type Records, skipping Products")
+            return cnt
+
+        rows = (
+            {
+                "dealer_id": ids.pick(),
+                "product_type_id": pids.pick(),
+                "name": p["name"],
+                "description": p["description"],
+                "item_price": p["item_price"],
+                "active": True,
+                "location_id": None
+            }
+            for p in source.records("dealer_products")
         )
+        # save to the database
+        cnt = bulk_insert(Product, rows, batch_size)
 
-        if r.status_code == 200:
-            resp = r.json()
-            dealers = db.query(Dealer).limit(cfg.QUERY_LIMIT).all()
-            pt = db.query(ProductType).all()
-            ids = [d.id for d in dealers]
-            pids = [p.id for p in pt]
-
-            for p in resp:
-                product = Product(
-                    dealer_id=random.choice(ids),
-                    product_type_id=random.choice(pids),
-                    name=p["name"],
-                    description=p["description"],
-                    item_price=p["item_price"],
-                    active=True,
-                    location=None
-                )
-                # save to the database
-                try:
-                    db.add(product)
-                    db.commit()
-                    db.flush()
-                    cnt += 1
-                    logger.info("Product ID: {} added for Dealer ID: {}".format(str(product.id), str(product.dealer_id)))
-
-                except SQLAlchemyError as db_err:
-                    logger.info("Database Error: {}".format(str(db_err)))
-
-            # log the totals
-            logger.info("{} Total Dealer Products Created".format(str(cnt)))
-        else:
-            logger.warning("API status code: {}".format(str(r.status_code)))
+        # log the totals
+        logger.info("{} Total Dealer Products Created".format(str(cnt)))
 
-    except requests.exceptions.HTTPError as http_err:
+    except requests.exceptions.RequestException as http_err:
         logger.warning("HTTP Connection Error: {}".format(str(http_err)))
 
     return cnt
 
 
-def get_customer_orders():
-    """ Get Customer Order Mock Data from API Endpoint """
-    API_PATH = "customer_order.json"
-    method = "GET"
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    params = None
+def get_customer_orders(batch_size=None, source=None):
+    """ Get Customer Order Mock Data from the Data Source """
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
-        )
-        if r.status_code == 200:
-            resp = r.json()
-            customers = db.query(Customer).limit(cfg.QUERY_LIMIT).all()
-            ids = [{"customer_id": c.id, "dealer_id": c.dealer_id} for c in customers]
-            for r in resp:
-                for c in ids:
-                    r.update(c)
-                    # add a new customer order
-                    nco = CustomerOrder(
-                        dealer_id=r["dealer_id"],
-                        customer_id=r["customer_id"],
-                        order_number=r["order_number"],
-                        order_date=datetime.now(),
-                        order_status=r["order_status"]
-                    )
-                    # save to database
-                    db.add(nco)
-                    db.commit()
-                    db.flush()
-                    logger.info("Customer ID: {} order completed successfully".format(str(r["customer_id"])))
-                    cnt += 1
-
-    except requests.exceptions.HTTPError as http_error:
+        customers = id_pools.get(db, Customer, "dealer_id", limit=cfg.QUERY_LIMIT)
+        records = iter(source.records("customer_order"))
+        first = next(records, None)
+
+        if first is None:
+            # the source has no order records, generate an order number per customer
+            logger.warning("No Customer Order Records from source, generating order numbers")
+            rows = (
+                {
+                    "dealer_id": dealer_id,
+                    "customer_id": customer_id,
+                    "order_number": get_order_number(customer_id),
+                    "order_date": datetime.now(),
+                    "order_status": True
+                }
+                for customer_id, dealer_id in customers
+            )
+        else:
+            # add a new customer order
+            rows = (
+                {
+                    "dealer_id": dealer_id,
+                    "customer_id": customer_id,
+                    "order_number": r["order_number"],
+                    "order_date": datetime.now(),
+                    "order_status": r["order_status"]
+                }
+                for r in itertools.chain([first], records)
+                for customer_id, dealer_id in customers
+            )
+        # save to database
+        cnt = bulk_insert(CustomerOrder, rows, batch_size)
+
+    except requests.exceptions.RequestException as http_error:
         logger.info("HTTP Error: {}".format(str(http_error)))
 
     return cnt
 
 
-def get_customer_order_details():
+def get_customer_order_details(batch_size=None, source=None):
     """ Get the Order Detail with Products and Price."""
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    method = "GET"
-    params = None
+    source = source or get_source()
     cnt = 0
-    API_PATH = "/customer_order_detail.json"
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        order_ids = id_pools.get(db, CustomerOrder, limit=cfg.QUERY_LIMIT)
+        product_ids = id_pools.get(db, Product, limit=cfg.QUERY_LIMIT)
+        if not order_ids or not product_ids:
+            logger.warning("No Customer Order or Product Records, skipping Order Details")
+            return cnt
+
+        rows = (
+            {
+                "order_id": order_ids.pick(),
+                "order_product_id": product_ids.pick(),
+                "order_product_quantity": int(n["order_product_quantity"]),
+                "order_product_item_price": float(n["order_product_item_price"]),
+                "order_line_item_total": float(n["order_product_quantity"] * n["order_product_item_price"])
+            }
+            for n in source.records("customer_order_detail")
         )
+        # save to the database
+        cnt = bulk_insert(OrderDetail, rows, batch_size)
 
-        if r.status_code == 200:
-            resp = r.json()
-            orders = db.query(CustomerOrder).limit(cfg.QUERY_LIMIT).all()
-            order_ids = [o.id for o in orders]
-            products = db.query(Product).limit(cfg.QUERY_LIMIT).all()
-            product_ids = [p.id for p in products]
-            for n in resp:
-                cod = OrderDetail(
-                    order_id=random.choice(order_ids),
-                    order_product_id=random.choice(product_ids),
-                    order_product_quantity=int(n["order_product_quantity"]),
-                    order_product_item_price=float(n["order_product_item_price"]),
-                    order_line_item_total=float(n["order_product_quantity"] * n["order_product_item_price"])
-                )
-                # save to the database
-                db.add(cod)
-                db.commit()
-                db.flush()
-                logger.info("Customer Order Detail Updated: {}".format(str(cod.id)))
-                cnt += 1
-        else:
-            logger.info("API returned status code: {}".format(str(r.status_code)))
-
-    except requests.exceptions.HTTPError as http_err:
+    except requests.exceptions.RequestException as http_err:
         logger.warning("HTTP Error: {}".format(str(http_err)))
 
     return cnt
 
 
-def get_customer_order_shipping():
-    hdr = {"Content-Type": "application/json", "User-Agent": "SEQUEL"}
-    API_PATH = "/customer_order_shipping.json"
-    method = "GET"
-    params = None
+def get_customer_order_shipping(batch_size=None, source=None):
+    source = source or get_source()
     cnt = 0
 
     try:
-        r = requests.request(
-            method,
-            cfg.BASE_URL + API_PATH + cfg.API_KEY,
-            headers=hdr,
-            params=params
+        orders = db.query(Customer.id, CustomerOrder.id, OrderDetail.id, Address.id).filter(
+            Customer.id == CustomerOrder.customer_id,
+            CustomerOrder.id == OrderDetail.order_id,
+            Customer.id == Address.customer_id
+        ).limit(cfg.QUERY_LIMIT).all()
+
+        # create a dictionary of the address ids and orders id to merge with the response data
+        ids = [{"address_id": o[3], "order_id": o[1], "order_detail_id": o[2]} for o in orders]
+
+        # create a new customer shipping record
+        rows = (
+            {
+                "address_id": n["address_id"],
+                "order_id": n["order_id"],
+                "order_detail_id": n["order_detail_id"],
+                "shipping_date": datetime.strptime(item["shipping_date"] + " 12:00:00", "%m/%d/%Y %H:%M:%S"),
+                "shipping_status": item["shipping_status"],
+                "shipping_tracking_number": item["shipping_tracking_number"],
+                "shipping_carrier": item["shipping_carrier"],
+                "shipping_delivered": item["shipping_delivered"],
+                "shipping_final_disposition": item["shipping_final_disposition"]
+            }
+            for item in source.records("customer_order_shipping")
+            for n in ids
         )
 
-        if r.status_code == 200:
-            resp = r.json()
-            orders = db.query(Customer.id, CustomerOrder.id, OrderDetail.id, Address.id).filter(
-                Customer.id == CustomerOrder.customer_id,
-                CustomerOrder.id == OrderDetail.order_id,
-                Customer.id == Address.customer_id
-            ).limit(cfg.QUERY_LIMIT).all()
-
-            # create a dictionary of the address ids and orders id to merge with the response data
-            ids = [{"address_id": o[3], "order_id": o[1], "order_detail_id": o[2]} for o in orders]
-
-            for item in resp:
-                for n in ids:
-                    item.update(n)
-                    # create a new customer shipping record
-                    cos = OrderShipping(
-                        address_id=item["address_id"],
-                        order_id=item["order_id"],
-                        order_detail_id=item["order_detail_id"],
-                        shipping_date=datetime.strptime(item["shipping_date"] + " 12:00:00", "%m/%d/%Y %H:%M:%S"),
-                        shipping_status=item["shipping_status"],
-                        shipping_tracking_number=item["shipping_tracking_number"],
-                        shipping_carrier=item["shipping_carrier"],
-                        shipping_delivered=item["shipping_delivered"],
-                        shipping_final_disposition=item["shipping_final_disposition"]
-                    )
-
-                    # save to the database
-                    db.add(cos)
-                    db.commit()
-                    db.flush()
-                    cnt += 1
-                    logger.info("Shipping Customer Order: {}".format(str(item["order_id"])))
-        else:
-            logger.info("API call returned HTTP Status Code: {}".format(str(r.status_code)))
-        
-    except requests.exceptions.HTTPError as http_err:
+        # save to the database
+        cnt = bulk_insert(OrderShipping, rows, batch_size)
+
+    except requests.exceptions.RequestException as http_err:
         logger.info("HTTP Error: {}".format(str(http_err)))
 
     return cnt
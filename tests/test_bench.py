@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench
+
+
+def result(throughput=100.0, samples=50, p50=0.010, p90=0.020, p99=0.030):
+    return {"throughput": throughput, "samples": samples, "p50": p50, "p90": p90, "p99": p99}
+
+
+def test_no_change():
+    baseline = {"op": result(), "load.dealer": result(samples=5)}
+    lines, regressions = bench.compare(baseline, dict(baseline))
+    assert regressions == []
+    assert len(lines) == 3
+
+
+def test_throughput_drop():
+    _, regressions = bench.compare({"op": result()}, {"op": result(throughput=60.0)})
+    assert len(regressions) == 1 and "throughput" in regressions[0]
+
+
+def test_median_growth():
+    _, regressions = bench.compare({"op": result()}, {"op": result(p50=0.020)})
+    assert len(regressions) == 1 and "p50" in regressions[0]
+
+
+def test_growth_within_threshold():
+    _, regressions = bench.compare({"op": result()}, {"op": result(throughput=80.0, p50=0.012)})
+    assert regressions == []
+
+
+def test_noise_floor():
+    # doubled, but by half a millisecond
+    baseline, current = result(p50=0.0005), result(p50=0.001)
+    assert bench.compare({"op": baseline}, {"op": current})[1] == []
+    assert bench.compare({"op": baseline}, {"op": current}, noise_floor=0.1)[1]
+
+
+def test_few_samples_skipped():
+    lines, regressions = bench.compare({"op": result(samples=3)}, {"op": result(samples=3, throughput=1.0)})
+    assert regressions == []
+    assert lines[1].endswith("skipped")
+    # a baseline recorded without sample counts is never compared
+    baseline = result()
+    del baseline["samples"]
+    assert bench.compare({"op": baseline}, {"op": result(throughput=1.0)})[1] == []
+
+
+def test_tail_percentiles_need_samples():
+    baseline, current = result(samples=100), result(samples=100, p90=0.1, p99=0.5)
+    assert bench.compare({"op": baseline}, {"op": current})[1] == []
+    _, regressions = bench.compare({"op": baseline}, {"op": current}, p90_samples=100)
+    assert len(regressions) == 1 and "p90" in regressions[0] and "p99" not in regressions[0]
+    _, regressions = bench.compare({"op": baseline}, {"op": current}, p90_samples=100, p99_samples=100)
+    assert "p99" in regressions[0]
+
+
+def test_missing_benchmark():
+    _, regressions = bench.compare({"op": result(), "gone": result()}, {"op": result()})
+    assert regressions == ["gone: missing from the results"]
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import distributed
+
+
+def test_slices_cover_the_agents():
+    plan = {"workers": 4, "seed": None, "backend": "thread"}
+    slices = distributed.make_slices(plan, 3)
+    assert [task["agent"] for task in slices] == [0, 1, 2]
+    assert all(task["agents"] == 3 and task["workers"] == 4 for task in slices)
+    assert all(task["seed"] is None for task in slices)
+    assert "agent" not in plan
+
+
+def test_seeds_spaced_past_the_workers():
+    plan = {"workers": 4, "seed": 100}
+    slices = distributed.make_slices(plan, 3)
+    assert [task["seed"] for task in slices] == [100, 105, 110]
+    # no two workers, worker seeds being the slice seed plus the worker id, share a seed
+    seeds = [task["seed"] + worker for task in slices for worker in range(plan["workers"])]
+    assert len(set(seeds)) == len(seeds)
+
+
+def test_stages_divided():
+    plan = {"workers": 2, "seed": 1, "stages": [(100.0, 10), (30.0, 5)]}
+    slices = distributed.make_slices(plan, 4)
+    for task in slices:
+        assert task["stages"] == [(25.0, 10), (7.5, 5)]
+    assert plan["stages"] == [(100.0, 10), (30.0, 5)]
+
+
+def test_parse_address():
+    assert distributed.parse_address("10.0.0.1:5000") == ("10.0.0.1", 5000)
+    assert distributed.parse_address(":5000") == ("localhost", 5000)
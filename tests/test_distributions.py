@@ -0,0 +1,75 @@
+import os
+import sys
+import random
+import pytest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import distributions
+from distributions import Uniform, Zipf, Hotspot, Latest, KeyChooser, parse
+
+SPECS = ["uniform", "zipf:0.5", "zipf:1.0", "zipf:1.5", "hotspot:0.2:0.8", "hotspot:0.5:1.0", "latest:1.0"]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 1000])
+def test_index_within_bounds(spec, n):
+    distribution = parse(spec)
+    rng = random.Random(7)
+    for _ in range(2000):
+        assert 0 <= distribution.index(rng, n) < n
+
+
+def test_zipf_favors_lowest_ids():
+    rng = random.Random(3)
+    counts = Counter(Zipf(1.0).index(rng, 100) for _ in range(20000))
+    assert counts[0] > counts[1] > counts[9] > counts[99]
+
+
+def test_latest_favors_highest_ids():
+    rng = random.Random(3)
+    counts = Counter(Latest(1.0).index(rng, 100) for _ in range(20000))
+    assert counts[99] > counts[98] > counts[0]
+
+
+def test_hotspot_traffic_share():
+    rng = random.Random(3)
+    picks = [Hotspot(0.1, 0.9).index(rng, 100) for _ in range(20000)]
+    hot = sum(1 for index in picks if index < 10) / len(picks)
+    assert 0.88 < hot < 0.92
+
+
+def test_parse():
+    assert isinstance(parse("uniform"), Uniform)
+    assert str(parse("zipf:1.1")) == "zipf:1.1"
+    assert str(parse("hotspot:0.1:0.9")) == "hotspot:0.1:0.9"
+    for spec in ("pareto", "zipf:1:2:3", "zipf:0", "hotspot:1.5"):
+        with pytest.raises(ValueError):
+            parse(spec)
+
+
+def test_configure_default_covers_keyed_tables():
+    chooser = KeyChooser()
+    chooser.configure({"default": "zipf:1.0", "product": "hotspot"})
+    for name in distributions.KEYED_TABLES:
+        assert chooser.skewed(name)
+    assert chooser.skewed("product")
+    assert not chooser.skewed("address")
+
+
+def test_pick_counts_touched_keys():
+    chooser = KeyChooser()
+    rng = random.Random(1)
+    keys = [chooser.pick("dealer", rng, 100, 5) for _ in range(50)]
+    assert all(100 <= key < 105 for key in keys)
+    assert sum(chooser.touched["dealer"].values()) == 50
+
+
+def test_merge_round_trip():
+    worker, parent = KeyChooser(), KeyChooser()
+    worker.touch("dealer", 3)
+    worker.touch("dealer", 3)
+    parent.touch("dealer", 3)
+    parent.merge(worker.to_dict())
+    assert parent.touched["dealer"] == Counter({3: 3})
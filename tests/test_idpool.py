@@ -0,0 +1,99 @@
+import os
+import sys
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from idpool import IdPool, IdPools
+from database import Base
+from models import Dealer, Customer
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return Session(engine)
+
+
+def add_dealers(session, ids):
+    session.execute(Dealer.__table__.insert(), [{"id": i, "name": "d{}".format(i)} for i in ids])
+    session.commit()
+
+
+def add_customers(session, dealers):
+    session.execute(Customer.__table__.insert(), [
+        {"dealer_id": dealer_id, "first_name": "f", "last_name": "l", "email": "e"} for dealer_id in dealers])
+    session.commit()
+
+
+def test_dense_ids_kept_as_bounds():
+    session = make_session()
+    add_dealers(session, range(1, 11))
+    pool = IdPool(Dealer.__table__.c.id)
+    assert pool.refresh(session) == 10
+    assert pool.ids is None
+    assert [row[0] for row in pool] == list(range(1, 11))
+    assert pool.refresh(session) == 0
+
+
+def test_refresh_fetches_only_new_rows():
+    session = make_session()
+    add_dealers(session, range(1, 6))
+    pool = IdPool(Dealer.__table__.c.id)
+    pool.refresh(session)
+    add_dealers(session, range(6, 9))
+    assert pool.refresh(session) == 3
+    assert len(pool) == 8
+    assert pool.ids is None
+
+
+def test_gap_materializes_ids():
+    session = make_session()
+    add_dealers(session, [1, 2, 3, 7, 8, 20])
+    pool = IdPool(Dealer.__table__.c.id)
+    pool.refresh(session)
+    assert pool.ids is not None
+    assert [row[0] for row in pool] == [1, 2, 3, 7, 8, 20]
+    add_dealers(session, [21, 30])
+    pool.refresh(session)
+    assert [pool.id_at(i) for i in range(len(pool))] == [1, 2, 3, 7, 8, 20, 21, 30]
+
+
+def test_cleared_when_rows_removed():
+    session = make_session()
+    add_dealers(session, range(1, 11))
+    pool = IdPool(Dealer.__table__.c.id)
+    pool.refresh(session)
+    session.execute(Dealer.__table__.delete())
+    add_dealers(session, range(1, 4))
+    assert pool.refresh(session) == 3
+    assert [row[0] for row in pool] == [1, 2, 3]
+
+
+def test_limit():
+    session = make_session()
+    add_dealers(session, range(1, 101))
+    pool = IdPool(Dealer.__table__.c.id, limit=10)
+    assert pool.refresh(session) == 10
+    add_dealers(session, range(101, 111))
+    assert pool.refresh(session) == 0
+    assert len(pool) == 10
+
+
+def test_paired_columns():
+    session = make_session()
+    add_dealers(session, [1, 2])
+    add_customers(session, [2, 1, 2])
+    pool = IdPools().get(session, Customer, "dealer_id")
+    assert list(pool) == [(1, 2), (2, 1), (3, 2)]
+    rng = random.Random(1)
+    for _ in range(20):
+        assert pool.pick_row(rng) in list(pool)
+
+
+def test_pick_empty():
+    pool = IdPool(Dealer.__table__.c.id)
+    assert pool.pick() is None
+    assert pool.pick_row() is None
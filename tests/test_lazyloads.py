@@ -0,0 +1,50 @@
+import os
+import sys
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lazyloads
+from database import Base
+from models import Dealer, Customer
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_insert_with_detector_attached():
+    detector = lazyloads.LazyLoadDetector()
+    detector.enable()
+    try:
+        session = make_session()
+        session.execute(Dealer.__table__.insert(), [{"name": "d1", "dealer_code": "D1"},
+                                                    {"name": "d2", "dealer_code": "D2"}])
+        session.commit()
+        assert session.execute(select(Dealer)).scalars().all()
+    finally:
+        detector.disable()
+
+
+def test_lazy_loads_flagged():
+    detector = lazyloads.LazyLoadDetector(threshold=1)
+    session = make_session()
+    session.execute(Dealer.__table__.insert(), [{"name": "d1", "dealer_code": "D1"},
+                                                {"name": "d2", "dealer_code": "D2"}])
+    session.execute(Customer.__table__.insert(), [
+        {"dealer_id": 1, "first_name": "a", "last_name": "a", "email": "a@x"},
+        {"dealer_id": 2, "first_name": "b", "last_name": "b", "email": "b@x"}])
+    session.commit()
+    detector.enable()
+    try:
+        for customer in session.execute(select(Customer)).scalars():
+            customer.dealer
+    finally:
+        detector.disable()
+    [entry] = [entry for entry in detector.stats.values() if entry["lazy_loads"]]
+    assert entry["executions"] == 1
+    assert entry["lazy_loads"] == 2
+    assert entry["n_plus_one"] == 1
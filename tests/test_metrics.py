@@ -0,0 +1,79 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from metrics import Histogram, bucket_index, bucket_value
+
+
+def test_small_values_get_their_own_bucket():
+    for value in range(1 << metrics.SUB_BITS):
+        assert bucket_index(value) == value
+        assert bucket_value(value) == value
+
+
+def test_bucket_value_bounds_the_bucket():
+    error = 1.0 / (1 << (metrics.SUB_BITS - 1))
+    for value in list(range(100, 5000)) + [10 ** 6, 123456789, 2 ** 40 + 7]:
+        index = bucket_index(value)
+        high = bucket_value(index)
+        assert high >= value
+        assert bucket_index(high) == index
+        assert bucket_index(high + 1) == index + 1
+        assert (high - value) / value <= error
+
+
+def test_bucket_index_is_monotonic():
+    indexes = [bucket_index(value) for value in range(0, 70000)]
+    assert indexes == sorted(indexes)
+
+
+def test_percentile():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0.0
+    for ms in range(1, 101):
+        histogram.record(ms / 1000.0)
+    assert histogram.count == 100
+    for p in (50, 90, 99):
+        assert abs(histogram.percentile(p) - p / 1000.0) <= p / 1000.0 * 0.016
+    assert histogram.percentile(100) == histogram.max / 1000000.0
+
+
+def test_percentile_capped_at_max():
+    histogram = Histogram()
+    histogram.record(0.0123456)
+    assert histogram.percentile(99) == histogram.max / 1000000.0
+
+
+def test_merge():
+    first, second, both = Histogram(), Histogram(), Histogram()
+    for i in range(1, 50):
+        first.record(i / 1000.0)
+        both.record(i / 1000.0)
+    for i in range(50, 200):
+        second.record(i / 1000.0, error=i % 10 == 0)
+        both.record(i / 1000.0, error=i % 10 == 0)
+    merged = first.merge(second)
+    assert merged is first
+    assert merged.counts == both.counts
+    assert (merged.count, merged.errors, merged.total) == (both.count, both.errors, both.total)
+    assert (merged.min, merged.max) == (both.min, both.max)
+    assert merged.percentile(90) == both.percentile(90)
+
+
+def test_merge_empty():
+    histogram = Histogram()
+    histogram.record(0.002)
+    histogram.merge(Histogram())
+    assert histogram.count == 1
+    assert Histogram().merge(histogram).min == histogram.min
+
+
+def test_round_trip():
+    histogram = Histogram()
+    for i in range(1, 20):
+        histogram.record(i / 100.0)
+    copy = Histogram.from_dict(histogram.to_dict())
+    assert copy.counts == histogram.counts
+    assert copy.percentile(50) == histogram.percentile(50)
@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mix import Mix, lock_error
+
+
+def make_mix(weights, seed=1):
+    return Mix({"name": "test", "operations": [
+        {"name": name, "kind": "point_lookup", "table": "dealer", "weight": weight,
+         "params": {"id": {"type": "int", "min": 1, "max": 10}}}
+        for name, weight in weights.items()
+    ]}, seed=seed)
+
+
+def test_cumulative_weights():
+    mix = make_mix({"a": 1, "b": 3, "c": 6})
+    assert mix.cum_weights == [1.0, 4.0, 10.0]
+
+
+def test_choose_follows_weights():
+    weights = {"a": 1, "b": 3, "c": 6}
+    mix = make_mix(weights)
+    draws = 20000
+    counts = Counter(mix.choose() for _ in range(draws))
+    for name, weight in weights.items():
+        assert abs(counts[name] / draws - weight / 10.0) < 0.02
+
+
+def test_zero_weight_never_chosen():
+    mix = make_mix({"a": 1, "never": 0, "b": 1})
+    assert "never" not in {mix.choose() for _ in range(5000)}
+
+
+def test_default_weight():
+    mix = Mix({"operations": [{"name": "a", "kind": "point_lookup", "table": "dealer"},
+                              {"name": "b", "kind": "point_lookup", "table": "dealer"}]})
+    assert mix.cum_weights == [1.0, 2.0]
+
+
+def test_seeded_choices_repeat():
+    first = make_mix({"a": 1, "b": 2}, seed=5)
+    second = make_mix({"a": 1, "b": 2}, seed=5)
+    assert [first.choose() for _ in range(100)] == [second.choose() for _ in range(100)]
+
+
+def test_plan_parameters():
+    mix = make_mix({"a": 1})
+    plan = mix.plan("a")
+    statement = next(plan)
+    assert 1 <= statement.compile().params["id_1"] <= 10
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        Mix({"operations": [{"name": "a", "kind": "teleport"}]})
+
+
+def test_lock_error():
+    assert lock_error(Exception("database is locked")) == "lock_timeout"
+    assert lock_error(Exception(1213, "Deadlock found")) == "deadlock"
+    assert lock_error(Exception("no such table")) is None
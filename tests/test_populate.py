@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import populate
+
+
+def make_tasks(names, log, lock, seconds=0.01):
+    def task(name):
+        def run():
+            with lock:
+                log.append(("start", name))
+            time.sleep(seconds)
+            with lock:
+                log.append(("end", name))
+            return name
+        return run
+    return {name: task(name) for name in names}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parents_loaded_before_children(workers):
+    graph = populate.dependencies()
+    log, lock = [], threading.Lock()
+    done = populate.run_graph(make_tasks(graph, log, lock), workers=workers)
+    assert set(done) == set(graph)
+    assert all(done[name]["result"] == name for name in graph)
+    position = {event: i for i, event in enumerate(log)}
+    for name, parents in graph.items():
+        for parent in parents:
+            assert position[("end", parent)] < position[("start", name)]
+
+
+def test_independent_tables_run_concurrently():
+    graph = populate.dependencies()
+    leaves = [name for name, parents in graph.items() if parents == {"dealer"}]
+    assert len(leaves) > 1
+    log, lock = [], threading.Lock()
+    populate.run_graph(make_tasks(["dealer"] + leaves, log, lock, seconds=0.05), workers=len(leaves))
+    starts = [i for i, (event, name) in enumerate(log) if event == "start" and name in leaves]
+    first_end = min(i for i, (event, name) in enumerate(log) if event == "end" and name in leaves)
+    assert max(starts) < first_end
+
+
+def test_single_worker_keeps_metadata_order():
+    graph = populate.dependencies()
+    log, lock = [], threading.Lock()
+    populate.run_graph(make_tasks(graph, log, lock, seconds=0), workers=1)
+    assert [name for event, name in log if event == "start"] == list(graph)
+
+
+def test_subset_only_depends_on_its_tables():
+    graph = populate.dependencies(["customer", "address"])
+    assert graph == {"customer": set(), "address": {"customer"}}
+
+
+def test_failed_table_raises():
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        populate.run_graph({"dealer": fail, "customer": lambda: 0}, workers=2)
+
+
+def test_unknown_table():
+    with pytest.raises(ValueError):
+        populate.run_graph({"nope": lambda: 0})
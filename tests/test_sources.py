@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sources import iter_json_array
+
+ITEMS = [
+    {"id": 1, "name": "a, [b]", "tags": ["x", "y"]},
+    {"id": 2, "name": "quote \" and } brace", "nested": {"deep": [1, 2, {"k": "v"}]}},
+    {"id": 3, "name": "unicode é中", "value": 1.5e3},
+    {"id": 4, "name": "", "empty": {}, "none": None},
+]
+
+
+def write(tmp_path, text):
+    path = tmp_path / "items.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 64 * 1024])
+def test_items_split_across_chunks(tmp_path, chunk_size):
+    path = write(tmp_path, json.dumps(ITEMS, ensure_ascii=False))
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64 * 1024])
+def test_whitespace_between_items(tmp_path, chunk_size):
+    path = write(tmp_path, "  \n[\n  " + ",\n\t ".join(json.dumps(item) for item in ITEMS) + "\n]\n")
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", ""])
+def test_empty(tmp_path, text):
+    assert list(iter_json_array(write(tmp_path, text), chunk_size=1)) == []
+
+
+def test_scalar_items(tmp_path):
+    path = write(tmp_path, "[1, 22, 333, \"s\", true, null]")
+    assert list(iter_json_array(path, chunk_size=2)) == [1, 22, 333, "s", True, None]
+
+
+def test_not_an_array(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path, "{\"id\": 1}"), chunk_size=3))
+
+
+def test_truncated(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path, "[{\"id\": 1}, {\"id\": "), chunk_size=4))
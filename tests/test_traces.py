@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traces import convert_paramstyle
+
+
+@pytest.mark.parametrize("qmark, format", [
+    ("SELECT * FROM dealer WHERE id = ?", "SELECT * FROM dealer WHERE id = %s"),
+    ("INSERT INTO t (a, b) VALUES (?, ?)", "INSERT INTO t (a, b) VALUES (%s, %s)"),
+    ("SELECT 1", "SELECT 1"),
+    ("SELECT * FROM t WHERE a = '?' AND b = ?", "SELECT * FROM t WHERE a = '?' AND b = %s"),
+    ("SELECT * FROM t WHERE \"col?\" = ?", "SELECT * FROM t WHERE \"col?\" = %s"),
+    ("SELECT * FROM t WHERE a LIKE 'x%' AND b = ?", "SELECT * FROM t WHERE a LIKE 'x%%' AND b = %s"),
+    ("SELECT a % 2 FROM t WHERE b = ?", "SELECT a %% 2 FROM t WHERE b = %s"),
+])
+def test_round_trip(qmark, format):
+    assert convert_paramstyle(qmark, "qmark", "format") == format
+    assert convert_paramstyle(format, "format", "qmark") == qmark
+
+
+def test_pyformat_takes_format():
+    sql = "SELECT * FROM t WHERE id = ?"
+    assert convert_paramstyle(sql, "qmark", "pyformat") == "SELECT * FROM t WHERE id = %s"
+    assert convert_paramstyle("SELECT %s", "pyformat", "format") == "SELECT %s"
+
+
+def test_same_style_unchanged():
+    sql = "SELECT * FROM t WHERE a LIKE 'x%' AND id = ?"
+    assert convert_paramstyle(sql, "qmark", "qmark") is sql
+
+
+def test_unsupported_styles():
+    with pytest.raises(ValueError):
+        convert_paramstyle("SELECT :id", "named", "qmark")
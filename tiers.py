@@ -0,0 +1,57 @@
+import time
+import logging
+
+# the workload's logger, its per row lines are silenced while comparing
+workload_logger = logging.getLogger("MAIN")
+
+# ORM entities, ORM column tuples, Core select with a cached compiled statement, raw DBAPI cursor
+TIERS = ("buffered", "columns", "core", "raw")
+
+
+def run_tiers(runner, tiers=TIERS, duration=None):
+    """
+    Run every read of the workload at each execution tier
+    :params workload runner, read modes to compare, seconds per operation and tier or one pass
+    :return dict of operation name to tier to runs, rows, wall and cpu seconds
+    """
+    results = {}
+    read_modes = runner.read_modes
+    # the per row log lines are formatted either way, but not written
+    level = workload_logger.level
+    workload_logger.setLevel(logging.WARNING)
+    try:
+        for name in runner.OPERATIONS:
+            results[name] = {}
+            for tier in tiers:
+                runner.read_modes = {"default": tier}
+                stats = {"runs": 0, "rows": 0}
+                start, cpu = time.perf_counter(), time.process_time()
+                while True:
+                    with runner.metrics.timer(name + "." + tier):
+                        stats["rows"] += runner.dispatch(name) or 0
+                    stats["runs"] += 1
+                    if duration is None or time.perf_counter() - start >= duration:
+                        break
+                stats["wall"] = time.perf_counter() - start
+                stats["cpu"] = time.process_time() - cpu
+                runner.db.commit()
+                results[name][tier] = stats
+    finally:
+        workload_logger.setLevel(level)
+        runner.read_modes = read_modes
+    return results
+
+
+def report(results):
+    """ Return the tiers side by side, rows/sec, CPU microseconds per row and CPU relative to the first tier """
+    lines = ["{:<32} {:<9} {:>9} {:>12} {:>11} {:>9}".format(
+        "operation", "tier", "rows", "rows/sec", "cpu us/row", "cpu")]
+    for name, by_tier in results.items():
+        base = None
+        for tier, stats in by_tier.items():
+            per_row = stats["cpu"] / stats["rows"] * 1000000 if stats["rows"] else 0.0
+            base = per_row if base is None else base
+            lines.append("{:<32} {:<9} {:>9} {:>12.0f} {:>11.2f} {:>8.2f}x".format(
+                name, tier, str(stats["rows"]), stats["rows"] / stats["wall"] if stats["wall"] else 0.0,
+                per_row, per_row / base if base else 0.0))
+    return lines
@@ -0,0 +1,389 @@
+import gzip
+import heapq
+import json
+import time
+import base64
+import logging
+import threading
+from decimal import Decimal
+from contextlib import contextmanager
+from datetime import datetime, date, time as day_time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from metrics import Metrics
+from profiler import normalize
+
+logger = logging.getLogger("MAIN.TRACE")
+
+VERSION = 1
+
+# trace records, one compact JSON list per line:
+#   ["H", version, dialect, paramstyle, settings]          header
+#   ["T", template id, sql]                                 a statement template, before its first use
+#   ["E", connection, template id, offset, duration, params, executemany]
+#   ["C", connection, offset] and ["R", connection, offset] commit and rollback
+HEADER, TEMPLATE, EXECUTE, COMMIT, ROLLBACK = "H", "T", "E", "C", "R"
+FORMATS = {"pyformat": "format"}
+
+
+def encode(value):
+    """ JSON for the parameter types json does not know, tagged so decode can restore them """
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, day_time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode("ascii")}
+    raise TypeError("Cannot trace a parameter of type {}".format(type(value).__name__))
+
+
+DECODERS = {
+    "$datetime": datetime.fromisoformat,
+    "$date": date.fromisoformat,
+    "$time": day_time.fromisoformat,
+    "$decimal": Decimal,
+    "$bytes": base64.b64decode,
+}
+
+
+def decode(obj):
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag in DECODERS:
+            return DECODERS[tag](value)
+    return obj
+
+
+def open_trace(path, mode):
+    """ Trace files are text, gzipped when the path ends in .gz """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class TraceRecorder(object):
+    """
+    Append every statement executed, and every commit and rollback, to a trace file
+    :params None
+    :return None
+    """
+
+    def __init__(self):
+        self.file = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.templates = {}
+        # connection ids are slots, held from checkout to checkin and then reused, so the ids stand for
+        # the connections in use at once even when the pool opens a new connection per checkout
+        self.free = []
+        self.slots = 0
+        self.origin = None
+        self.target = None
+        self.paused_depth = 0
+        self.count = 0
+
+    @property
+    def enabled(self):
+        return self.target is not None
+
+    def start(self, path, dialect, settings=None, target=Engine):
+        """ Open a new trace and record the statements of every engine, or of the target engine """
+        self.file = open_trace(path, "w")
+        self.templates = {}
+        self.free = []
+        self.slots = 0
+        self.count = 0
+        self.origin = time.perf_counter()
+        self.write([HEADER, VERSION, dialect.name, dialect.paramstyle, settings or {}])
+        event.listen(target, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(target, "after_cursor_execute", self.after_cursor_execute)
+        event.listen(target, "commit", self.commit)
+        event.listen(target, "rollback", self.rollback)
+        event.listen(Pool, "checkin", self.checkin)
+        self.target = target
+
+    def stop(self):
+        if self.target is not None:
+            event.remove(self.target, "before_cursor_execute", self.before_cursor_execute)
+            event.remove(self.target, "after_cursor_execute", self.after_cursor_execute)
+            event.remove(self.target, "commit", self.commit)
+            event.remove(self.target, "rollback", self.rollback)
+            event.remove(Pool, "checkin", self.checkin)
+            self.target = None
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    @contextmanager
+    def paused(self):
+        """ Leave the statements of the block out of the trace, i.e. restoring a snapshot """
+        with self.lock:
+            self.paused_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.paused_depth -= 1
+
+    def connection_id(self, conn):
+        """ The slot of a checked out connection, taken on its first statement """
+        info = conn.connection.info
+        connection_id = info.get("trace_connection")
+        if connection_id is None:
+            with self.lock:
+                if self.free:
+                    connection_id = heapq.heappop(self.free)
+                else:
+                    self.slots += 1
+                    connection_id = self.slots
+            info["trace_connection"] = connection_id
+        return connection_id
+
+    def checkin(self, dbapi_connection, connection_record):
+        connection_id = connection_record.info.pop("trace_connection", None) if connection_record else None
+        if connection_id is not None:
+            with self.lock:
+                heapq.heappush(self.free, connection_id)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = getattr(self.local, "starts", None)
+        if starts is None:
+            starts = self.local.starts = []
+        starts.append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = self.local.starts.pop()
+        duration = time.perf_counter() - start
+        if self.paused_depth:
+            return
+        connection_id = self.connection_id(conn)
+        with self.lock:
+            template = self.templates.get(statement)
+            if template is None:
+                template = self.templates[statement] = len(self.templates) + 1
+                self.write([TEMPLATE, template, statement])
+            self.write([EXECUTE, connection_id, template, round(start - self.origin, 6), round(duration, 6),
+                        parameters, bool(executemany)])
+            self.count += 1
+
+    def commit(self, conn):
+        self.transaction_end(COMMIT, conn)
+
+    def rollback(self, conn):
+        self.transaction_end(ROLLBACK, conn)
+
+    def transaction_end(self, kind, conn):
+        if self.paused_depth:
+            return
+        connection_id = self.connection_id(conn)
+        with self.lock:
+            self.write([kind, connection_id, round(time.perf_counter() - self.origin, 6)])
+
+    def write(self, record):
+        if self.file is not None:
+            self.file.write(json.dumps(record, separators=(",", ":"), default=encode))
+            self.file.write("\n")
+
+
+def read_trace(path):
+    """
+    Load a trace file
+    :params trace path
+    :return header dict, dict of template id to sql, dict of connection id to its ordered events
+    """
+    header = None
+    templates = {}
+    connections = {}
+    with open_trace(path, "r") as f:
+        for line in f:
+            record = json.loads(line, object_hook=decode)
+            kind = record[0]
+            if kind == HEADER:
+                header = {"version": record[1], "dialect": record[2], "paramstyle": record[3],
+                          "settings": record[4]}
+            elif kind == TEMPLATE:
+                templates[record[1]] = record[2]
+            elif kind == EXECUTE:
+                connections.setdefault(record[1], []).append(record)
+            elif kind in (COMMIT, ROLLBACK):
+                connections.setdefault(record[1], []).append(record)
+    if header is None:
+        raise ValueError("Not a trace file: {}".format(path))
+    return header, templates, connections
+
+
+def convert_paramstyle(sql, source, target):
+    """ Rewrite the placeholders of a statement between the qmark (?) and format (%s) styles """
+    # pyformat drivers take positional %s placeholders as well
+    source, target = (FORMATS.get(style, style) for style in (source, target))
+    if source == target:
+        return sql
+    if {source, target} != {"qmark", "format"}:
+        raise ValueError("Cannot replay {} parameters on a {} driver".format(source, target))
+    out = []
+    quote = None
+    i = 0
+    while i < len(sql):
+        c = sql[i]
+        if c == "%" and source == "qmark":
+            # format drivers read %% as a percent sign, in literals as well
+            out.append("%%")
+        elif source == "format" and sql.startswith("%%", i):
+            out.append("%")
+            i += 1
+        elif quote:
+            # placeholders are not replaced inside literals
+            if c == quote:
+                quote = None
+            out.append(c)
+        elif c in "'\"":
+            quote = c
+            out.append(c)
+        elif source == "qmark" and c == "?":
+            out.append("%s")
+        elif source == "format" and sql.startswith("%s", i):
+            out.append("?")
+            i += 1
+        else:
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def verb(sql):
+    words = sql.lstrip().split(None, 1)
+    return words[0].lower() if words else "statement"
+
+
+class Replayer(object):
+    """
+    Re-issue a trace against an engine, a thread per traced connection keeping its statements in order
+    :params engine, trace path, speed multiplier (0 issues every statement as soon as the last one is done)
+    :return None
+    """
+
+    def __init__(self, engine, path, speed=1.0):
+        self.engine = engine
+        self.speed = speed
+        self.header, self.templates, self.connections = read_trace(path)
+        paramstyle = engine.dialect.paramstyle
+        self.statements = {template: convert_paramstyle(sql, self.header["paramstyle"], paramstyle)
+                           for template, sql in self.templates.items()}
+        self.metrics = Metrics()
+        self.recorded = {}
+        self.replayed = {}
+        self.lock = threading.Lock()
+        self.stats = {"statements": 0, "transactions": 0, "errors": 0, "seconds": 0.0}
+        self.start = None
+
+    def run(self):
+        """ Replay every connection's events on schedule, scaled by the speed """
+        if self.header["dialect"] != self.engine.dialect.name:
+            logger.warning("Replaying a {} trace on {}, the statements may not be portable".format(
+                self.header["dialect"], self.engine.dialect.name))
+        threads = [threading.Thread(target=self.replay_connection, args=(events,), name="replay-{}".format(cid))
+                   for cid, events in sorted(self.connections.items())]
+        self.start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stats["seconds"] = time.perf_counter() - self.start
+        self.stats["span"] = max([events[-1][3 if events[-1][0] == EXECUTE else 2]
+                                  for events in self.connections.values()] or [0.0])
+        return self.stats
+
+    def replay_connection(self, events):
+        connection = self.engine.raw_connection()
+        cursor = connection.cursor()
+        try:
+            for record in events:
+                kind = record[0]
+                offset = record[3] if kind == EXECUTE else record[2]
+                if self.speed:
+                    delay = self.start + offset / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        self.metrics.record("replay.lag", -delay)
+                start = time.perf_counter()
+                error = False
+                try:
+                    if kind == EXECUTE:
+                        self.execute(cursor, record)
+                    elif kind == COMMIT:
+                        connection.commit()
+                    else:
+                        connection.rollback()
+                except Exception as err:
+                    # the recorded run went on after its failures, so does the replay
+                    error = True
+                    logger.debug("Replay error: {}".format(str(err)))
+                    connection.rollback()
+                elapsed = time.perf_counter() - start
+                if kind == EXECUTE:
+                    name = "replay." + verb(self.templates[record[2]])
+                    with self.lock:
+                        self.stats["statements"] += 1
+                        self.stats["errors"] += error
+                        self.add(self.recorded, record[2], record[4])
+                        self.add(self.replayed, record[2], elapsed)
+                else:
+                    name = "replay.commit" if kind == COMMIT else "replay.rollback"
+                    with self.lock:
+                        self.stats["transactions"] += 1
+                        self.stats["errors"] += error
+                self.metrics.record(name, elapsed, error=error)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def execute(self, cursor, record):
+        sql = self.statements[record[2]]
+        params, executemany = record[5], record[6]
+        if executemany:
+            cursor.executemany(sql, [self.params(p) for p in params])
+        else:
+            cursor.execute(sql, self.params(params))
+
+    @staticmethod
+    def params(params):
+        return params if isinstance(params, dict) else tuple(params)
+
+    @staticmethod
+    def add(totals, template, seconds):
+        entry = totals.get(template)
+        if entry is None:
+            entry = totals[template] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def report(self, n=10, width=80):
+        """ Return the replay summary and the top n statements by recorded time, recorded against replayed """
+        stats = self.stats
+        lines = [
+            "Replayed {} statements and {} commits/rollbacks on {} connections, {} errors".format(
+                str(stats["statements"]), str(stats["transactions"]), str(len(self.connections)),
+                str(stats["errors"])),
+            "Replay took {:.3f}s for a recorded span of {:.3f}s at {}".format(
+                stats["seconds"], stats.get("span", 0.0), "{:g}x".format(self.speed) if self.speed else "full speed"),
+            "{:>8} {:>12} {:>12} {:>8}  {}".format("count", "recorded ms", "replayed ms", "delta", "statement"),
+        ]
+        top = sorted(self.recorded.items(), key=lambda item: item[1][1], reverse=True)[:n]
+        for template, (count, recorded) in top:
+            replayed = self.replayed[template][1]
+            lines.append("{:>8} {:>12.3f} {:>12.3f} {:>+7.1f}%  {}".format(
+                count, recorded / count * 1000, replayed / count * 1000,
+                (replayed - recorded) / recorded * 100.0 if recorded else 0.0,
+                normalize(self.templates[template])[:width]))
+        return lines
+
+
+# the process wide recorder, attached to every engine while recording
+registry = TraceRecorder()
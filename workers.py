@@ -0,0 +1,125 @@
+import time
+import logging
+import logpipe
+import database
+import profiler
+import distributions
+from pools import PoolMonitor
+from metrics import Metrics
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger("MAIN.WORKERS")
+
+BACKENDS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+def worker_loop(workload_class, worker_id, duration=None, iterations=1, options=None, profile=False, seed=None,
+                process=False):
+    """
+    Run the workload operations on a dedicated engine and session
+    :params workload_class, worker id, duration in seconds or iterations, seed offset by the worker id,
+            whether the worker runs in a process of its own
+    :return worker stats dict
+    """
+    # process workers start from clean registries and hand them back, thread workers share the caller's,
+    # which may itself be a worker or agent process
+    if process:
+        logpipe.registry.reset()
+        distributions.registry.reset()
+        if profile:
+            profiler.registry.reset()
+            profiler.registry.enable()
+
+    metrics = Metrics()
+    engine = database.make_engine(monitor=PoolMonitor(metrics))
+    session = database.make_session(engine)
+    workload = workload_class(db=session, metrics=metrics, seed=seed + worker_id if seed is not None else None,
+                              **(options or {}))
+    stats = {"worker": worker_id, "operations": 0, "errors": 0, "rows": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+    remaining = iterations * len(workload.operations())
+
+    try:
+        while True:
+            name = workload.next_operation()
+            try:
+                stats["rows"] += workload.run_operation(name) or 0
+                stats["operations"] += 1
+            except SQLAlchemyError as db_err:
+                session.rollback()
+                stats["errors"] += 1
+                logger.warning("Worker {} {} failed: {}".format(str(worker_id), name, str(db_err)))
+            remaining -= 1
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    break
+            elif remaining <= 0:
+                break
+    finally:
+        stats["seconds"] = time.perf_counter() - start
+        # hand the connection back first, so the pool gauges read as the worker left them
+        session.close()
+        engine.dispose()
+        stats["metrics"] = metrics.to_dict()
+        if process:
+            stats["row_log"] = logpipe.registry.to_dict()
+            stats["keys_touched"] = distributions.registry.to_dict()
+            if profile:
+                stats["statements"] = profiler.registry.to_dict()
+
+    return stats
+
+
+def run_workers(workload_class, workers=1, backend="thread", duration=None, iterations=1, options=None,
+                seed=None):
+    """
+    Run the workload concurrently, one session and connection per worker
+    :params workload_class, number of workers, thread or process backend
+    :return list of worker stats, wall clock seconds
+    """
+    try:
+        executor_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown worker backend: {}".format(backend))
+
+    start = time.perf_counter()
+    with executor_class(max_workers=workers) as executor:
+        futures = [
+            executor.submit(worker_loop, workload_class, i, duration, iterations, options,
+                            profiler.registry.enabled, seed, backend == "process")
+            for i in range(workers)
+        ]
+        stats = [f.result() for f in futures]
+    for s in stats:
+        profiler.registry.merge(s.get("statements", {}))
+        logpipe.registry.merge(s.get("row_log", []))
+        distributions.registry.merge(s.get("keys_touched", {}))
+    return stats, time.perf_counter() - start
+
+
+def merge_metrics(stats):
+    """ Merge the latency histograms returned by every worker """
+    merged = Metrics()
+    for s in stats:
+        merged.merge(Metrics.from_dict(s["metrics"]))
+    return merged
+
+
+def report(stats, wall):
+    """ Return the aggregate and per worker throughput report lines """
+    operations = sum(s["operations"] for s in stats)
+    errors = sum(s["errors"] for s in stats)
+    rows = sum(s["rows"] for s in stats)
+    lines = ["{} workers: {} operations, {} errors, {} rows in {:.3f}s ({:.1f} ops/sec, {:.0f} rows/sec)".format(
+        str(len(stats)), str(operations), str(errors), str(rows), wall,
+        operations / wall if wall else 0.0, rows / wall if wall else 0.0)]
+    for s in stats:
+        lines.append("Worker {}: {} operations, {} errors, {} rows in {:.3f}s ({:.1f} ops/sec)".format(
+            str(s["worker"]), str(s["operations"]), str(s["errors"]), str(s["rows"]), s["seconds"],
+            s["operations"] / s["seconds"] if s["seconds"] else 0.0))
+    return lines